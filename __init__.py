@@ -3,8 +3,12 @@ from .dynamic_lora_offset import DynamicLoraOffset
 from .dynamic_lora_block_weights import DynamicLoraBlockWeights
 from .dynamic_lora_config import DynamicLoraConfig
 from .dynamic_lora_config_combiner import DynamicLoraConfigCombiner
+from .dynamic_lora_config_library import DynamicLoraConfigLibrary
 from .dynamic_lora_embedding import DynamicLoraEmbedding
 from .dynamic_lora_loader import DynamicLoraLoader
+from .dynamic_lora_batch_loader import DynamicLoraBatchLoader
+from .dynamic_lora_sweep import DynamicLoraStrengthSweep
+from .dynamic_lora_metrics import get_stats
 
 NODE_CLASS_MAPPINGS = {
     "DynamicLoraKeyword": DynamicLoraKeyword,
@@ -12,8 +16,11 @@ NODE_CLASS_MAPPINGS = {
     "DynamicLoraBlockWeights": DynamicLoraBlockWeights,
     "DynamicLoraConfig": DynamicLoraConfig,
     "DynamicLoraConfigCombiner": DynamicLoraConfigCombiner,
+    "DynamicLoraConfigLibrary": DynamicLoraConfigLibrary,
     "DynamicLoraEmbedding": DynamicLoraEmbedding,
     "DynamicLoraLoader": DynamicLoraLoader,
+    "DynamicLoraBatchLoader": DynamicLoraBatchLoader,
+    "DynamicLoraStrengthSweep": DynamicLoraStrengthSweep,
 }
 
 NODE_DISPLAY_NAME_MAPPINGS = {
@@ -22,6 +29,20 @@ NODE_DISPLAY_NAME_MAPPINGS = {
     "DynamicLoraBlockWeights": "Dynamic Lora Block Weights",
     "DynamicLoraConfig": "Dynamic Lora Config",
     "DynamicLoraConfigCombiner": "Dynamic Lora Config Combiner",
+    "DynamicLoraConfigLibrary": "Dynamic Lora Config Library",
     "DynamicLoraEmbedding": "Dynamic Lora Embedding",
     "DynamicLoraLoader": "Dynamic Lora Loader",
-}
\ No newline at end of file
+    "DynamicLoraBatchLoader": "Dynamic Lora Batch Loader",
+    "DynamicLoraStrengthSweep": "Dynamic Lora Strength Sweep",
+}
+
+# Scrapeable loader metrics and cache statistics, only when running inside the ComfyUI server
+try:
+    from aiohttp import web
+    from server import PromptServer
+
+    @PromptServer.instance.routes.get("/dynamic_lora/stats")
+    async def dynamic_lora_stats(request):
+        return web.json_response(get_stats())
+except Exception:
+    pass
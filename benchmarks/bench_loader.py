@@ -0,0 +1,508 @@
+"""Benchmarks for the Dynamic LoRA Loader that run without ComfyUI or a GPU.
+
+folder_paths, nodes and comfy.* are replaced by small in-memory stubs and the LoRAs are tiny
+synthetic safetensors files in a temporary directory, so the numbers measure this package's own
+overhead (prompt processing, keyword matching, combo resolution, cache and patch bookkeeping).
+Results are written as JSON so runs on different commits can be compared:
+
+    python benchmarks/bench_loader.py --output before.json
+    python benchmarks/bench_loader.py --output after.json --compare before.json
+"""
+import argparse
+import gc
+import importlib.util
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import types
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE_NAME = "dynamic_lora_bench"
+
+# Synthetic SDXL-style module names every fake LoRA file draws its keys from
+UNET_MODULES = [f"{kind}_{n}_1_transformer_blocks_0_attn1_{proj}"
+                for kind, blocks in (("input_blocks", range(1, 9)), ("output_blocks", range(0, 9)))
+                for n in blocks for proj in ("to_q", "to_k", "to_v", "to_out_0")]
+UNET_MODULES += [f"middle_block_1_transformer_blocks_0_attn1_{proj}" for proj in ("to_q", "to_k", "to_v", "to_out_0")]
+TE_MODULES = [f"text_model_encoder_layers_{n}_self_attn_{proj}"
+              for n in range(12) for proj in ("q_proj", "v_proj")]
+
+SYLLABLES = ["ka", "lo", "mi", "ren", "so", "ta", "vu", "zel", "an", "be", "cor", "di", "fa", "gu", "hi", "jo"]
+
+
+# --- ComfyUI stubs -----------------------------------------------------------------------------
+
+class FakeTensor:
+    """Shape-only stand-in for a torch tensor, enough for the cache's byte accounting."""
+
+    def __init__(self, shape):
+        self.shape = tuple(shape)
+
+    def numel(self):
+        n = 1
+        for d in self.shape:
+            n *= d
+        return n
+
+    def element_size(self):
+        return 2
+
+
+class FakeModelPatcher:
+    """The parts of comfy.model_patcher.ModelPatcher the loader relies on."""
+
+    def __init__(self, model, patches=None):
+        self.model = model
+        self.patches = patches or {}
+        self.patches_uuid = None
+
+    def clone(self):
+        return FakeModelPatcher(self.model, {k: list(v) for k, v in self.patches.items()})
+
+    def add_patches(self, patches, strength_patch=1.0, strength_model=1.0):
+        for key, patch in patches.items():
+            # (weight key, offset[, function]) keys are filed under the weight key, as in ComfyUI
+            name, offset, function = (key, None, None) if isinstance(key, str) else (key + (None,))[:3]
+            self.patches.setdefault(name, []).append((strength_patch, patch, strength_model, offset, function))
+        return list(patches)
+
+
+class FakeClip:
+    def __init__(self, cond_stage_model, patcher):
+        self.cond_stage_model = cond_stage_model
+        self.patcher = patcher
+
+    def clone(self):
+        return FakeClip(self.cond_stage_model, self.patcher.clone())
+
+    def add_patches(self, patches, strength_patch=1.0, strength_model=1.0):
+        return self.patcher.add_patches(patches, strength_patch, strength_model)
+
+
+class SDXL:
+    """model_config stand-in; model_arch() only looks at the class name."""
+
+
+class FakeUnet:
+    def __init__(self):
+        self.model_config = SDXL()
+
+    def state_dict(self):
+        return {}
+
+
+class FakeTextEncoder:
+    def state_dict(self):
+        return {}
+
+
+def make_model_and_clip():
+    return FakeModelPatcher(FakeUnet()), FakeClip(FakeTextEncoder(), FakeModelPatcher(FakeTextEncoder()))
+
+
+def _read_safetensors(path, safe_load=True):
+    with open(path, "rb") as f:
+        data = f.read()
+    (length,) = struct.unpack("<Q", data[:8])
+    header = json.loads(data[8:8 + length])
+    header.pop("__metadata__", None)
+    return {k: FakeTensor(v["shape"]) for k, v in header.items()}
+
+
+def _model_lora_keys_unet(model, key_map):
+    for m in UNET_MODULES:
+        key_map[f"lora_unet_{m}"] = f"diffusion_model.{m.replace('_1_transformer', '.1.transformer')}.weight"
+    return key_map
+
+
+def _model_lora_keys_clip(model, key_map):
+    for m in TE_MODULES:
+        key_map[f"lora_te1_{m}"] = f"clip_l.transformer.{m}.weight"
+    return key_map
+
+
+def _load_lora(lora, key_map):
+    patches = {}
+    for lora_key, model_key in key_map.items():
+        up = lora.get(f"{lora_key}.lora_up.weight")
+        if up is not None:
+            patches[model_key] = ("diff", (up,))
+    return patches
+
+
+class _LoraLoader:
+    def load_lora(self, model, clip, lora_name, strength_model, strength_clip):
+        return (model, clip)
+
+
+class _CLIPTextEncode:
+    def encode(self, clip, text):
+        return ([[text, {}]],)
+
+
+def install_stubs(lora_dir, user_dir):
+    """Register stub folder_paths, nodes and comfy modules in sys.modules."""
+    folder_paths = types.ModuleType("folder_paths")
+    folder_paths.get_filename_list = lambda kind: sorted(os.listdir(lora_dir)) if kind == "loras" else []
+    folder_paths.get_folder_paths = lambda kind: [lora_dir] if kind == "loras" else []
+    folder_paths.get_user_directory = lambda: user_dir
+    folder_paths.get_temp_directory = lambda: user_dir
+
+    def get_full_path(kind, name):
+        full = os.path.join(lora_dir, name)
+        return full if kind == "loras" and os.path.exists(full) else None
+    folder_paths.get_full_path = get_full_path
+
+    nodes = types.ModuleType("nodes")
+    nodes.LoraLoader = _LoraLoader
+    nodes.CLIPTextEncode = _CLIPTextEncode
+
+    comfy = types.ModuleType("comfy")
+    comfy.__path__ = []
+    comfy_utils = types.ModuleType("comfy.utils")
+    comfy_utils.load_torch_file = _read_safetensors
+    comfy_lora = types.ModuleType("comfy.lora")
+    comfy_lora.model_lora_keys_unet = _model_lora_keys_unet
+    comfy_lora.model_lora_keys_clip = _model_lora_keys_clip
+    comfy_lora.load_lora = _load_lora
+    comfy.utils, comfy.lora = comfy_utils, comfy_lora
+
+    for name, module in (("folder_paths", folder_paths), ("nodes", nodes), ("comfy", comfy),
+                         ("comfy.utils", comfy_utils), ("comfy.lora", comfy_lora)):
+        sys.modules[name] = module
+
+
+def load_package():
+    """Import the repository as a package without it being installed under custom_nodes."""
+    spec = importlib.util.spec_from_file_location(
+        PACKAGE_NAME, os.path.join(REPO_DIR, "__init__.py"), submodule_search_locations=[REPO_DIR])
+    package = importlib.util.module_from_spec(spec)
+    sys.modules[PACKAGE_NAME] = package
+    spec.loader.exec_module(package)
+    return package
+
+
+def submodule(name):
+    return sys.modules[f"{PACKAGE_NAME}.{name}"]
+
+
+# --- Synthetic data ----------------------------------------------------------------------------
+
+def write_lora(path, rng, n_unet, n_te, rank=4, dim=64):
+    """Minimal but valid safetensors file with n_unet UNet and n_te text encoder LoRA modules."""
+    modules = [f"lora_unet_{m}" for m in rng.sample(UNET_MODULES, n_unet)]
+    modules += [f"lora_te1_{m}" for m in rng.sample(TE_MODULES, n_te)]
+    header, offset = {}, 0
+    for m in modules:
+        for suffix, shape in ((".lora_down.weight", [rank, dim]), (".lora_up.weight", [dim, rank])):
+            size = shape[0] * shape[1] * 2
+            header[m + suffix] = {"dtype": "F16", "shape": shape, "data_offsets": [offset, offset + size]}
+            offset += size
+    header["__metadata__"] = {"ss_base_model_version": "sdxl_base_v1-0"}
+    raw = json.dumps(header).encode("utf-8")
+    with open(path, "wb") as f:
+        f.write(struct.pack("<Q", len(raw)))
+        f.write(raw)
+        f.write(b"\0" * offset)
+
+
+def make_word(rng):
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+
+
+def make_configs(n, rng, n_files, groups_per_config=1, keywords_per_group=2, combo_size=3,
+                 combo_fraction=0.2, offsets_per_config=1, always_on=2):
+    """n LoraConfig records as DynamicLoraConfig / DynamicLoraConfigCombiner would produce them."""
+    LoraConfig = submodule("dynamic_lora_config_record").LoraConfig
+    cfgs = []
+    for i in range(n):
+        keywords_groups = [] if i < always_on else [
+            {"keywords": [f"{make_word(rng)}{i}_{g}_{k}" for k in range(keywords_per_group)],
+             "multiplier": round(rng.uniform(0.5, 1.5), 2)}
+            for g in range(groups_per_config)]
+        cfgs.append(LoraConfig(
+            f"cfg{i}",
+            f"lora_{i % n_files}.safetensors",
+            base_strength=round(rng.uniform(0.3, 1.2), 2),
+            keywords_groups=keywords_groups,
+            offsets={f"cfg{rng.randrange(n)}": round(rng.uniform(0.8, 1.2), 2) for _ in range(offsets_per_config)},
+            activation_tags=[f"tag{i}"] if i % 50 == 0 else [],
+            block_weights={"MID_global_structure": 0.5, "OUT07_final_pass": 0.0} if i % 7 == 0 else {},
+        ))
+
+    # Link runs of consecutive configs into combo groups, alternating the two combine modes
+    n_combo = int(n * combo_fraction) // combo_size * combo_size
+    for start in range(0, n_combo, combo_size):
+        mode = "all_or_none" if (start // combo_size) % 2 == 0 else "primary_triggers_all"
+        for index, j in enumerate(range(start, start + combo_size)):
+            cfgs[j] = cfgs[j].with_combo(f"combined_{start}", mode, index)
+    return cfgs
+
+
+def make_prompt(cfgs, rng, n_words, n_hits):
+    """Prompt of about n_words filler words that triggers the keywords of n_hits configs."""
+    words = [make_word(rng) for _ in range(n_words)]
+    keyed = [c for c in cfgs if c.keywords_groups]
+    for c in rng.sample(keyed, min(n_hits, len(keyed))):
+        words.insert(rng.randrange(len(words) + 1), rng.choice(c.keywords_groups[0].keywords))
+    return ", ".join(words)
+
+
+def make_template(rng, n_groups, depth=2, options=4):
+    """Prompt with n_groups randomizer codes, nested up to depth and partly weighted."""
+    def group(level):
+        opts = []
+        for o in range(options):
+            opt = make_word(rng)
+            if level < depth and o == 0:
+                opt += " " + group(level + 1)
+            if o == 1:
+                opt = f"{rng.randint(2, 5)}*{opt}"
+            opts.append(opt)
+        return "{" + ":".join(opts) + "}"
+    return ", ".join(f"{make_word(rng)} {group(1)}" for _ in range(n_groups))
+
+
+# --- Timing ------------------------------------------------------------------------------------
+
+def timed(fn, repeat, setup=None):
+    """Run fn repeat times; returns (per-call seconds, last return value)."""
+    times, result = [], None
+    gc.collect()
+    for i in range(repeat):
+        if setup is not None:
+            setup(i)
+        start = time.perf_counter()
+        result = fn(i)
+        times.append(time.perf_counter() - start)
+    return times, result
+
+
+def summarize(name, params, times, **extra):
+    ms = [t * 1000.0 for t in times]
+    result = {
+        "name": name,
+        "params": params,
+        "repeat": len(ms),
+        "min_ms": round(min(ms), 4),
+        "median_ms": round(statistics.median(ms), 4),
+        "mean_ms": round(statistics.fmean(ms), 4),
+        "stdev_ms": round(statistics.stdev(ms), 4) if len(ms) > 1 else 0.0,
+    }
+    result.update(extra)
+    return result
+
+
+def reset_caches():
+    submodule("dynamic_lora_plan")._PLAN_CACHE.clear()
+    submodule("dynamic_lora_matcher")._MATCHER_CACHE.clear()
+    submodule("dynamic_lora_randomizer").compile_template.cache_clear()
+    submodule("dynamic_lora_cache").lora_cache().clear()
+
+
+def bench_end_to_end(cfgs, prompts, repeat, mode):
+    """build_model_clip_and_prompts with per-stage times taken from the node's trace output.
+    cold: fresh node, base model and caches every call; warm: identical inputs every call;
+    incremental: alternate between prompts that select different LoRAs, caches kept."""
+    Loader = submodule("dynamic_lora_loader").DynamicLoraLoader
+    state = {"node": Loader(), "base": make_model_and_clip()}
+    traces = []
+
+    def setup(i):
+        if mode == "cold":
+            reset_caches()
+            state["node"] = Loader()
+            state["base"] = make_model_and_clip()
+
+    def run(i):
+        model, clip = state["base"]
+        prompt = prompts[i % len(prompts)] if mode == "incremental" else prompts[0]
+        out = state["node"].build_model_clip_and_prompts(model, prompt, "lowres, blurry", clip=clip,
+                                                          seed=1234, config_1=cfgs)
+        traces.append(json.loads(out[4]))
+        return out
+
+    if mode != "cold":
+        run(0)  # fill the caches the warm runs are meant to hit
+        traces.clear()
+    times, _ = timed(run, repeat, setup)
+    stages = {}
+    for t in traces:
+        for stage, ms in t.get("stages_ms", {}).items():
+            stages.setdefault(stage, []).append(ms)
+    return times, {
+        "stages_median_ms": {s: round(statistics.median(v), 4) for s, v in sorted(stages.items())},
+        "counts": traces[-1].get("counts", {}) if traces else {},
+    }
+
+
+def bench_combinations(cfgs, prompt, repeat):
+    """_resolve_config_combinations on the configs the prompt's keywords select."""
+    loader = submodule("dynamic_lora_loader")
+    matcher = submodule("dynamic_lora_matcher")
+    node = loader.DynamicLoraLoader()
+    matches = matcher.get_keyword_matcher(cfgs).match(prompt)
+    selected = [c for i, c in enumerate(cfgs) if not c.keywords_groups or i in matches]
+    times, final = timed(lambda i: node._resolve_config_combinations(cfgs, list(selected), {}), repeat)
+    return times, {"selected": len(selected), "resolved": len(final)}
+
+
+def bench_randomizer(template, repeat, cold):
+    loader = submodule("dynamic_lora_loader")
+    randomizer = submodule("dynamic_lora_randomizer")
+    node = loader.DynamicLoraLoader()
+    setup = (lambda i: randomizer.compile_template.cache_clear()) if cold else None
+    times, _ = timed(lambda i: node._process_randomizer_codes(template, random.Random(i)), repeat, setup)
+    return times, {"template_chars": len(template)}
+
+
+# --- Driver ------------------------------------------------------------------------------------
+
+SHAPES = {
+    # keyword groups per config, keywords per group
+    "small_groups": (1, 2),
+    "large_groups": (3, 8),
+}
+
+
+def run_suite(args, lora_dir):
+    rng = random.Random(args.seed)
+    for i in range(args.files):
+        write_lora(os.path.join(lora_dir, f"lora_{i}.safetensors"), rng,
+                   n_unet=rng.randint(8, 40), n_te=rng.randint(0, 12))
+
+    # Index the LoRA headers up front so the background scan doesn't overlap the timed runs
+    index = submodule("dynamic_lora_header_index").header_index(start_scan=False)
+    index.scan()
+
+    results = []
+    for size in args.sizes:
+        for shape, (groups, per_group) in SHAPES.items():
+            cfgs = make_configs(size, rng, args.files, groups, per_group,
+                                combo_size=args.combo_size, combo_fraction=args.combo_fraction,
+                                offsets_per_config=args.offsets)
+            for words in args.prompt_words:
+                prompts = [make_prompt(cfgs, rng, words, args.hits) for _ in range(2)]
+                params = {"configs": size, "shape": shape, "keyword_groups": groups,
+                          "keywords_per_group": per_group, "prompt_words": words, "hits": args.hits}
+                tag = f"{size}/{shape}/{words}w"
+                for mode in ("cold", "warm", "incremental"):
+                    times, extra = bench_end_to_end(cfgs, prompts, args.repeat, mode)
+                    results.append(summarize(f"build_model_clip_and_prompts/{mode}/{tag}",
+                                             dict(params, mode=mode), times, **extra))
+                times, extra = bench_combinations(cfgs, prompts[0], args.repeat)
+                results.append(summarize(f"resolve_config_combinations/{tag}", params, times, **extra))
+                log(results[-4:])
+
+    for n_groups in args.randomizer_groups:
+        template = make_template(rng, n_groups)
+        for cold in (True, False):
+            times, extra = bench_randomizer(template, args.repeat, cold)
+            name = f"process_randomizer_codes/{'cold' if cold else 'warm'}/{n_groups}g"
+            results.append(summarize(name, {"groups": n_groups, "cold": cold}, times, **extra))
+            log(results[-1:])
+    return results
+
+
+def log(results):
+    for r in results:
+        print(f"{r['name']:<70} median {r['median_ms']:>10.3f} ms", file=sys.stderr)
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "-C", REPO_DIR, "rev-parse", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path, threshold):
+    """Print median ratios against a previous run; returns the names that regressed past threshold."""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {r["name"]: r for r in json.load(f).get("results", [])}
+    regressions = []
+    print(f"\n{'benchmark':<70} {'before':>10} {'after':>10} {'ratio':>7}", file=sys.stderr)
+    for r in results:
+        old = baseline.get(r["name"])
+        if old is None or not old["median_ms"]:
+            continue
+        ratio = r["median_ms"] / old["median_ms"]
+        flag = " !" if ratio > threshold else ""
+        print(f"{r['name']:<70} {old['median_ms']:>10.3f} {r['median_ms']:>10.3f} {ratio:>7.2f}{flag}",
+              file=sys.stderr)
+        if ratio > threshold:
+            regressions.append(r["name"])
+    return regressions
+
+
+def parse_int_list(text):
+    return [int(x) for x in text.split(",") if x.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=parse_int_list, default=[10, 100, 1000, 10000],
+                        help="comma-separated config counts")
+    parser.add_argument("--prompt-words", type=parse_int_list, default=[20, 200],
+                        help="comma-separated filler word counts per prompt")
+    parser.add_argument("--randomizer-groups", type=parse_int_list, default=[1, 10, 100, 1000],
+                        help="comma-separated randomizer code counts per template")
+    parser.add_argument("--hits", type=int, default=8, help="configs whose keywords each prompt triggers")
+    parser.add_argument("--files", type=int, default=32, help="synthetic LoRA files shared by the configs")
+    parser.add_argument("--combo-size", type=int, default=3)
+    parser.add_argument("--combo-fraction", type=float, default=0.2, help="share of configs linked into combos")
+    parser.add_argument("--offsets", type=int, default=1, help="offsets per config")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--quick", action="store_true", help="small sizes and 3 repeats, for a fast check")
+    parser.add_argument("--output", help="write the JSON results here instead of stdout")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare medians against")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="with --compare, exit 1 when a median grows by more than this factor")
+    args = parser.parse_args(argv)
+    if args.quick:
+        args.sizes, args.prompt_words, args.randomizer_groups, args.repeat = [10, 100, 1000], [20], [10, 100], 3
+
+    with tempfile.TemporaryDirectory(prefix="dynamic_lora_bench_") as tmp:
+        lora_dir, user_dir = os.path.join(tmp, "loras"), os.path.join(tmp, "user")
+        os.makedirs(lora_dir)
+        os.makedirs(user_dir)
+        os.environ.setdefault("DYNAMIC_LORA_MERGE_CACHE_DIR", os.path.join(tmp, "merge_cache"))
+        install_stubs(lora_dir, user_dir)
+        load_package()
+        logging.getLogger("DynamicLoraLoader").setLevel(logging.WARNING)
+        results = run_suite(args, lora_dir)
+
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.time(),
+            "options": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare and compare(results, args.compare, args.threshold):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
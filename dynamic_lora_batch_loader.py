@@ -0,0 +1,73 @@
+from .dynamic_lora_loader import DynamicLoraLoader
+from .dynamic_lora_metrics import logger, metrics
+from .dynamic_lora_plan import DEFAULT_STRENGTH_EPSILON
+
+class DynamicLoraBatchLoader(DynamicLoraLoader):
+    """Batch variant of DynamicLoraLoader - one prompt per line.
+    Resolves the LoRA plan of every prompt, groups prompts that share an identical plan
+    and patches MODEL/CLIP once per group. Outputs one (MODEL, CLIP, pos_prompt, neg_prompt)
+    entry per prompt, ordered by group, where the prompts of a group share that group's patched
+    MODEL/CLIP objects, plus a JSON trace of the whole batch."""
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        types = super().INPUT_TYPES()
+        required = types["required"]
+        del required["pos_prompt"], required["neg_prompt"]
+        del types["optional"]["encode_prompts"]
+        required["pos_prompts"] = ("STRING", {"multiline": True, "default": ""})
+        required["neg_prompts"] = ("STRING", {"multiline": True, "default": ""})
+        return types
+
+    RETURN_TYPES = ("MODEL", "CLIP", "STRING", "STRING", "STRING",)
+    RETURN_NAMES = ("model", "clip", "pos_prompts", "neg_prompts", "trace",)
+    OUTPUT_IS_LIST = (True, True, True, True, False,)
+    FUNCTION = "build_batches"
+    CATEGORY = "conditioning"
+
+    @classmethod
+    def IS_CHANGED(cls, pos_prompts="", neg_prompts="", **kwargs):
+        return super().IS_CHANGED(pos_prompt=pos_prompts, neg_prompt=neg_prompts, **kwargs)
+
+    def _split_prompts(self, text):
+        return [line.strip() for line in (text or "").splitlines() if line.strip()]
+
+    def build_batches(self, model, pos_prompts, neg_prompts, clip=None, seed=-1,
+                      whole_word_keywords=False, merge_cache=False, optimize_plan=True,
+                      strength_epsilon=DEFAULT_STRENGTH_EPSILON, **kwargs):
+        pos_list = self._split_prompts(pos_prompts)
+        neg_list = self._split_prompts(neg_prompts)
+        if not pos_list:
+            return ([], [], [], [], "{}")
+        # A single negative prompt is shared by every positive prompt
+        if len(neg_list) <= 1:
+            neg_list = (neg_list or [""]) * len(pos_list)
+        elif len(neg_list) != len(pos_list):
+            raise ValueError(f"[DynamicLoraBatchLoader] Got {len(pos_list)} positive but {len(neg_list)} negative prompts")
+
+        with metrics().run("DynamicLoraBatchLoader") as trace:
+            pos_embeddings = self._collect_embeddings(kwargs, "pos_embedding_")
+            neg_embeddings = self._collect_embeddings(kwargs, "neg_embedding_")
+            cfgs = self._collect_configs(kwargs)
+            trace.count("configs", len(cfgs))
+            trace.count("prompts", len(pos_list))
+
+            # Group prompts by identical plan, keeping first-seen order
+            groups = {}
+            for i, (pos, neg) in enumerate(zip(pos_list, neg_list)):
+                prompt_seed = seed + i if seed >= 0 else seed
+                plan = self.resolve_plan(pos, neg, cfgs, pos_embeddings, neg_embeddings,
+                                         prompt_seed, whole_word_keywords, optimize_plan, strength_epsilon)
+                groups.setdefault(plan.entries, []).append(plan)
+            trace.count("plans", len(groups))
+
+            logger.info(f"[DynamicLoraBatchLoader] {len(pos_list)} prompts share {len(groups)} distinct LoRA plans")
+
+            models, clips, pos_out, neg_out = [], [], [], []
+            for plans in groups.values():
+                m, c = self.apply_plan(model, clip, plans[0], merge_cache) if cfgs else (model, clip)
+                models.extend([m] * len(plans))
+                clips.extend([c] * len(plans))
+                pos_out.extend(p.pos_prompt for p in plans)
+                neg_out.extend(p.neg_prompt for p in plans)
+        return (models, clips, pos_out, neg_out, trace.to_json())
@@ -0,0 +1,108 @@
+import re
+from functools import lru_cache
+from .dynamic_lora_header_index import TE_PREFIXES, UNET_PREFIXES
+
+# SDXL-style UNet (input_blocks 0-8, middle_block, output_blocks 0-8)
+_SDXL_RE = re.compile(r"(input_blocks|middle_block|output_blocks)[._](\d+)?")
+# diffusers-style UNet (down_blocks, mid_block, up_blocks with 3 layers each)
+_DIFFUSERS_RE = re.compile(r"(down_blocks|mid_block|up_blocks)(?:[._](\d+))?(?:[._](attentions|resnets|upsamplers|downsamplers)[._](\d+))?")
+
+
+def lora_key_target(key):
+    """"unet", "te" or None for a LoRA state-dict key."""
+    if key.startswith(TE_PREFIXES):
+        return "te"
+    if key.startswith(UNET_PREFIXES):
+        return "unet"
+    return None
+
+
+_OUT_BLOCKS = ("OUT00_object_features", "OUT01_mid_level_semantics", "OUT02_higher_semantics",
+               "OUT03_composition", "OUT04_style_refinement", "OUT05_global_meaning",
+               "OUT06_late_abstraction", "OUT07_final_pass")
+
+
+def _ldm_block(arch, kind, n):
+    if kind == "middle_block":
+        return "MID_global_structure"
+    if kind == "input_blocks":
+        return ("IN00_fine_texture" if n <= 3 else
+                "IN01_low_level_edges" if n <= 6 else
+                "IN02_detail_refinement")
+    if arch in ("sd1", "sd2"):
+        # 12 output blocks, the first 3 have no attention
+        return _OUT_BLOCKS[0 if n < 3 else min(n - 3, 7)]
+    # SDXL: 9 output blocks
+    return _OUT_BLOCKS[min(n, 7)]
+
+
+def _diffusers_block(arch, kind, n, sub, m):
+    if kind == "mid_block":
+        return "MID_global_structure"
+    # Every diffusers down/up block covers 3 consecutive ldm input/output blocks, in both the
+    # SD1/SD2 and the SDXL layout; the sampler sits last
+    m = 2 if sub in ("upsamplers", "downsamplers") else m or 0
+    if kind == "down_blocks":
+        return _ldm_block(arch, "input_blocks", 3 * n + 1 + m)
+    return _ldm_block(arch, "output_blocks", 3 * n + m)
+
+
+@lru_cache(maxsize=65536)
+def block_of_key(key, arch="sdxl"):
+    """Block weight name (see BLOCK_WEIGHT_ORDER) a UNet LoRA or model key belongs to, None otherwise.
+    arch ("sdxl", "sd1", "sd2") picks the output block layout."""
+    if key.startswith(TE_PREFIXES):
+        return None
+    m = _SDXL_RE.search(key)
+    if m:
+        return _ldm_block(arch, m.group(1), int(m.group(2) or 0))
+    m = _DIFFUSERS_RE.search(key)
+    if m:
+        return _diffusers_block(arch, m.group(1), int(m.group(2) or 0), m.group(3),
+                                int(m.group(4)) if m.group(4) is not None else None)
+    return None
+
+
+def model_block_index(key_map, arch):
+    """Precomputed model weight key -> block name for every UNet key a LoRA can target."""
+    index = {}
+    for model_key in set(key_map.values()):
+        name = model_key[0] if isinstance(model_key, tuple) else model_key
+        if isinstance(name, str) and name.startswith("diffusion_model."):
+            block = block_of_key(name, arch)
+            if block is not None:
+                index[name] = block
+    return index
+
+
+def scale_by_block(patches, strength, block_weights, block_index):
+    """Split patches into [(strength, patches), ...] with per-block strengths applied.
+    Keys in zero-weight blocks are dropped rather than patched with 0."""
+    weights = {k: float(w) for k, w in block_weights if isinstance(w, (int, float))}
+    if not weights or all(w == 1.0 for w in weights.values()):
+        return [(patches, strength)] if patches else []
+    buckets = {}
+    for key, patch in patches.items():
+        name = key[0] if isinstance(key, tuple) else key
+        mult = weights.get(block_index.get(name), 1.0)
+        if mult == 0:
+            continue
+        buckets.setdefault(strength * mult, {})[key] = patch
+    return [(bucket, s) for s, bucket in buckets.items()]
+
+
+def key_filter(block_weights=(), patch_model=True, patch_clip=True, arch="sdxl"):
+    """Predicate keeping the LoRA keys that would actually be patched, or None to keep all."""
+    zero_blocks = {name for name, w in block_weights if w == 0}
+    if not zero_blocks and patch_model and patch_clip:
+        return None
+
+    def keep(key):
+        target = lora_key_target(key)
+        if target == "te":
+            return patch_clip
+        if target == "unet" and not patch_model:
+            return False
+        return target != "unet" or block_of_key(key, arch) not in zero_blocks
+
+    return keep
@@ -0,0 +1,242 @@
+import os
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+from .dynamic_lora_metrics import CacheCounters, env_int
+
+DEFAULT_BUDGET_BYTES = 4 * 1024 ** 3
+
+
+def state_dict_nbytes(sd):
+    """Approximate RAM held by the tensors of a state dict."""
+    if hasattr(sd, "materialized_nbytes"):
+        return sd.materialized_nbytes()
+    total = 0
+    for t in sd.values():
+        try:
+            total += t.numel() * t.element_size()
+        except AttributeError:
+            pass
+    return total
+
+
+def file_cache_key(path):
+    """(resolved path, mtime, size) - changes whenever the file on disk is replaced."""
+    full = os.path.realpath(path)
+    st = os.stat(full)
+    return (full, st.st_mtime_ns, st.st_size)
+
+
+class LazyLoraStateDict(Mapping):
+    """Read-only state dict over a memory-mapped safetensors file.
+    Tensors are materialized on first access and kept; unread keys cost no RAM.
+    on_materialize, when set, is called with (self, nbytes) for every tensor read."""
+
+    def __init__(self, path):
+        from safetensors import safe_open
+        self.path = path
+        self._file = safe_open(path, framework="pt", device="cpu")
+        self._keys = tuple(self._file.keys())
+        self._key_set = frozenset(self._keys)
+        self._tensors = {}
+        self._nbytes = 0
+        self._lock = threading.Lock()
+        self.on_materialize = None
+
+    def __getitem__(self, key):
+        t = self._tensors.get(key)
+        if t is not None:
+            return t
+        if key not in self._key_set:
+            raise KeyError(key)
+        nbytes = 0
+        with self._lock:
+            t = self._tensors.get(key)
+            if t is None:
+                t = self._file.get_tensor(key)
+                self._tensors[key] = t
+                nbytes = t.numel() * t.element_size()
+                self._nbytes += nbytes
+        callback = self.on_materialize
+        if nbytes and callback is not None:
+            callback(self, nbytes)
+        return t
+
+    def __contains__(self, key):
+        return key in self._key_set
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def materialized_nbytes(self):
+        return self._nbytes
+
+    def view(self, keep):
+        """Mapping restricted to the keys accepted by keep (all keys when keep is None)."""
+        return self if keep is None else _FilteredStateDict(self, keep)
+
+
+class _FilteredStateDict(Mapping):
+    """Subset of a state dict; filtered-out keys are invisible and never read."""
+
+    def __init__(self, sd, keep):
+        self._sd = sd
+        self._keys = tuple(k for k in sd if keep(k))
+        self._key_set = frozenset(self._keys)
+
+    def __getitem__(self, key):
+        if key not in self._key_set:
+            raise KeyError(key)
+        return self._sd[key]
+
+    def __contains__(self, key):
+        return key in self._key_set
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+
+def filtered_state_dict(sd, keep):
+    """Restrict any state dict to the keys accepted by keep."""
+    if keep is None:
+        return sd
+    if hasattr(sd, "view"):
+        return sd.view(keep)
+    return _FilteredStateDict(sd, keep)
+
+
+def _load_torch_file(path):
+    # With the shared store enabled, every process on the host maps one deserialized copy
+    from .dynamic_lora_shm import shared_store
+    store = shared_store()
+    if store is not None:
+        return store.get(file_cache_key(path), _load_local_file)
+    return _load_local_file(path)
+
+
+def _load_local_file(path):
+    # safetensors files are mapped lazily, anything else is loaded whole
+    if path.lower().endswith(".safetensors"):
+        try:
+            return LazyLoraStateDict(path)
+        except ImportError:
+            pass
+    import comfy.utils
+    return comfy.utils.load_torch_file(path, safe_load=True)
+
+
+class LoraStateDictCache(CacheCounters):
+    """Process-wide LRU cache of loaded LoRA state dicts bounded by a RAM budget in bytes."""
+
+    def __init__(self, budget_bytes=None):
+        self.budget_bytes = (env_int("DYNAMIC_LORA_CACHE_BYTES", DEFAULT_BUDGET_BYTES)
+                             if budget_bytes is None else int(budget_bytes))
+        self._entries = OrderedDict()  # key -> (state_dict, nbytes)
+        self._loading = {}  # key -> [done event, state_dict, error] for loads in flight
+        self._bytes = 0
+        self._lock = threading.RLock()
+
+    def get(self, path, loader=None):
+        """Return the state dict for path, loading it from disk on a miss.
+        Concurrent misses for the same file wait for a single load."""
+        key = file_cache_key(path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            pending = self._loading.get(key)
+            if pending is None:
+                pending = self._loading[key] = [threading.Event(), None, None]
+                owner = True
+                self.misses += 1
+            else:
+                owner = False
+                self.hits += 1
+
+        if not owner:
+            pending[0].wait()
+            if pending[2] is not None:
+                raise pending[2]
+            return pending[1]
+
+        try:
+            sd = (loader or _load_torch_file)(key[0])
+            pending[1] = sd
+            self.put(key, sd)
+            return sd
+        except Exception as e:
+            pending[2] = e
+            raise
+        finally:
+            with self._lock:
+                self._loading.pop(key, None)
+            pending[0].set()
+
+    def put(self, key, sd):
+        nbytes = state_dict_nbytes(sd)
+        with self._lock:
+            if key in self._entries or nbytes > self.budget_bytes:
+                return
+            # Drop stale versions of the same file
+            for old in [k for k in self._entries if k[0] == key[0]]:
+                self._bytes -= self._entries.pop(old)[1]
+            self._entries[key] = (sd, nbytes)
+            self._bytes += nbytes
+            if hasattr(sd, "on_materialize"):
+                # Lazily loaded state dicts grow as their tensors are read
+                sd.on_materialize = lambda sd, grown: self._grow(key, sd, grown)
+            self._evict()
+
+    def _grow(self, key, sd, grown):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] is not sd:
+                return
+            self._entries[key] = (sd, entry[1] + grown)
+            self._bytes += grown
+            self._evict()
+
+    def contains(self, path):
+        try:
+            key = file_cache_key(path)
+        except OSError:
+            return False
+        with self._lock:
+            return key in self._entries
+
+    def _evict(self):
+        while self._bytes > self.budget_bytes and self._entries:
+            _, (_, nbytes) = self._entries.popitem(last=False)
+            self._bytes -= nbytes
+            self.evictions += 1
+
+    def set_budget(self, budget_bytes):
+        with self._lock:
+            self.budget_bytes = int(budget_bytes)
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return self.counter_stats(entries=len(self._entries), bytes=self._bytes,
+                                      budget_bytes=self.budget_bytes)
+
+
+_LORA_CACHE = LoraStateDictCache()
+
+
+def lora_cache():
+    """The shared LoRA state-dict cache."""
+    return _LORA_CACHE
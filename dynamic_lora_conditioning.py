@@ -0,0 +1,96 @@
+import threading
+import weakref
+from collections import OrderedDict
+from .dynamic_lora_metrics import CacheCounters, env_int
+
+DEFAULT_BUDGET_BYTES = 512 * 1024 ** 2
+
+
+def conditioning_nbytes(cond):
+    """Approximate RAM held by the tensors of a CONDITIONING list (including pooled outputs)."""
+    if isinstance(cond, dict):
+        return sum(conditioning_nbytes(v) for v in cond.values())
+    if isinstance(cond, (list, tuple)):
+        return sum(conditioning_nbytes(v) for v in cond)
+    try:
+        return cond.numel() * cond.element_size()
+    except AttributeError:
+        return 0
+
+
+def _ref(obj):
+    try:
+        return weakref.ref(obj)
+    except TypeError:
+        return lambda: obj
+
+
+class ConditioningCache(CacheCounters):
+    """Process-wide LRU cache of encoded prompts bounded by a RAM budget in bytes.
+    Entries are keyed by the unpatched CLIP, the text encoder LoRAs patched into it and the prompt,
+    which together determine the encoder output."""
+
+    def __init__(self, budget_bytes=None):
+        self.budget_bytes = (env_int("DYNAMIC_LORA_CONDITIONING_CACHE_BYTES", DEFAULT_BUDGET_BYTES)
+                             if budget_bytes is None else int(budget_bytes))
+        self._entries = OrderedDict()  # key -> (weakref to CLIP, conditioning, nbytes)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, clip, te_plan, prompt):
+        """Cached conditioning, or None. te_plan is a hashable description of the applied text encoder LoRAs."""
+        key = (id(clip), te_plan, prompt)
+        with self._lock:
+            entry = self._entries.get(key)
+            # id() is only unique while the CLIP is alive
+            if entry is not None and entry[0]() is not clip:
+                self._bytes -= self._entries.pop(key)[2]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, clip, te_plan, prompt, cond):
+        nbytes = conditioning_nbytes(cond)
+        key = (id(clip), te_plan, prompt)
+        with self._lock:
+            if nbytes > self.budget_bytes:
+                return
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            self._entries[key] = (_ref(clip), cond, nbytes)
+            self._bytes += nbytes
+            self._evict()
+
+    def _evict(self):
+        while self._bytes > self.budget_bytes and self._entries:
+            _, (_, _, nbytes) = self._entries.popitem(last=False)
+            self._bytes -= nbytes
+            self.evictions += 1
+
+    def set_budget(self, budget_bytes):
+        with self._lock:
+            self.budget_bytes = int(budget_bytes)
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return self.counter_stats(entries=len(self._entries), bytes=self._bytes,
+                                      budget_bytes=self.budget_bytes)
+
+
+_CONDITIONING_CACHE = ConditioningCache()
+
+
+def conditioning_cache():
+    """The shared conditioning cache."""
+    return _CONDITIONING_CACHE
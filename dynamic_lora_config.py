@@ -1,4 +1,10 @@
 import folder_paths
+from .dynamic_lora_blocks import key_filter
+from .dynamic_lora_config_record import normalize_config
+from .dynamic_lora_header_index import header_index
+from .dynamic_lora_metrics import logger
+from .dynamic_lora_plan import ordered_block_weights
+from .dynamic_lora_prefetch import prefetcher
 
 class DynamicLoraConfig:
     """LoRA config node with dynamic inputs for keywords, offsets, and block weights.
@@ -10,6 +16,12 @@ class DynamicLoraConfig:
             loras = folder_paths.get_filename_list("loras") or []
         except Exception:
             loras = []
+
+        # Keep the LoRA header index fresh while the UI is being built (a no-op while a scan runs)
+        try:
+            header_index().scan_in_background()
+        except Exception as e:
+            logger.warning(f"[DynamicLoraConfig] Header index unavailable: {e}")
             
         # Core required fields
         required = {
@@ -78,17 +90,12 @@ class DynamicLoraConfig:
                 if isinstance(value, dict):
                     block_weights.update(value)
         
-        # Parse activation tags
-        tags = [t.strip() for t in (activation_tags or "").split(",") if t.strip()]
-        
-        return ({
-            "id": str(id) if id else str(lora_name or ""),
-            "path": lora_name,
-            "base_strength": float(base_strength),
-            "min_strength": float(min_strength),
-            "max_strength": float(max_strength),
-            "keywords_groups": keywords_groups,
-            "offsets": offsets,
-            "activation_tags": tags,
-            "block_weights": block_weights,
-        },)
\ No newline at end of file
+        # Optionally start reading the LoRA now so disk I/O overlaps the rest of the graph
+        if prefetcher().on_config and lora_name:
+            full = folder_paths.get_full_path("loras", lora_name)
+            if full:
+                prefetcher().prefetch([(full, key_filter(ordered_block_weights(block_weights)))])
+
+        return (normalize_config(id, lora_name, base_strength, min_strength, max_strength,
+                                 activation_tags, keywords_groups, offsets, block_weights),)
+
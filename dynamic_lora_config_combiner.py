@@ -1,3 +1,5 @@
+from .dynamic_lora_config_record import collect_configs, combo_group_id
+
 class DynamicLoraConfigCombiner:
     """Combines multiple LoRA configs so when one is activated (loaded via keywords), others are also activated and loaded.
     They still function normally otherwise (independent keyword matching, strength calculations, etc.)."""
@@ -15,46 +17,35 @@ class DynamicLoraConfigCombiner:
         for i in range(1, 11):  # Start with 10 potential slots
             optional[f"config_{i}"] = ("DYNAMIC_LORA_CONFIG",)
         
+        # Any number of configs at once, e.g. from the Config Library or another combiner
+        optional["config_list"] = ("DYNAMIC_LORA_CONFIG_LIST",)
+        
         return {"required": required, "optional": optional}
     
-    RETURN_TYPES = tuple(["DYNAMIC_LORA_CONFIG"] * 10)  # Return up to 10 configs
-    RETURN_NAMES = tuple([f"config_{i}" for i in range(1, 11)])
+    # Up to 10 individual configs, plus every linked config (however many) as one bundle
+    RETURN_TYPES = tuple(["DYNAMIC_LORA_CONFIG"] * 10) + ("DYNAMIC_LORA_CONFIG_LIST",)
+    RETURN_NAMES = tuple([f"config_{i}" for i in range(1, 11)]) + ("config_list",)
     FUNCTION = "combine_configs"
     CATEGORY = "conditioning"
     
     def combine_configs(self, combine_mode="all_or_none", **kwargs):
         """Combine configs with linking behavior."""
         
-        # Collect all config inputs
-        configs = []
-        for key, value in kwargs.items():
-            if key.startswith("config_") and value is not None:
-                if isinstance(value, dict):
-                    configs.append(value)
-                elif isinstance(value, list):
-                    configs.extend([c for c in value if isinstance(c, dict)])
+        # Collect all config and config list inputs
+        configs = collect_configs(kwargs)
         
         if not configs:
-            # Return None for all outputs
-            return tuple([None] * 10)
-        
-        # Add linking metadata to each config
-        group_id = f"combined_{id(self)}"  # Unique group identifier
-        
-        for i, config in enumerate(configs):
-            # Create a copy to avoid modifying original
-            linked_config = dict(config)
-            
-            # Add linking metadata
-            linked_config["_combo_group"] = group_id
-            linked_config["_combo_mode"] = combine_mode
-            linked_config["_combo_members"] = [c.get("id", f"config_{j}") for j, c in enumerate(configs)]
-            linked_config["_combo_index"] = i
-            
-            configs[i] = linked_config
-        
-        # Pad with None values to match return count
-        while len(configs) < 10:
-            configs.append(None)
-        
-        return tuple(configs[:10])
\ No newline at end of file
+            # Return None for the single outputs and an empty bundle
+            return tuple([None] * 10) + ((),)
+        
+        # Add linking metadata to each config; the group id is derived from the members,
+        # so re-running the same graph (or reloading the workflow) yields the same group
+        group_id = combo_group_id(configs, combine_mode)
+        
+        # Configs are immutable, so linked copies keep memberships of groups they were already combined into
+        configs = [config.with_combo(group_id, combine_mode, i) for i, config in enumerate(configs)]
+        
+        # Pad the single outputs with None values to match return count
+        singles = configs[:10] + [None] * (10 - len(configs[:10]))
+        
+        return tuple(singles) + (tuple(configs),)
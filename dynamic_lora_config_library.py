@@ -0,0 +1,141 @@
+import json
+import os
+from .dynamic_lora_config_record import combo_group_id, normalize_config
+from .dynamic_lora_matcher import get_keyword_matcher
+from .dynamic_lora_metrics import logger
+
+try:
+    import tomllib
+except ImportError:
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+# (path, mtime, size) -> parsed library
+_LIBRARY_CACHE = {}
+
+
+def read_library(full):
+    """Parsed JSON or TOML content of a library file."""
+    if full.lower().endswith(".toml"):
+        if tomllib is None:
+            raise RuntimeError("[DynamicLoraConfigLibrary] TOML libraries need Python 3.11+ or the tomli package")
+        with open(full, "rb") as f:
+            return tomllib.load(f)
+    with open(full, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _parse_keywords(groups):
+    keywords_groups = []
+    for group in groups or []:
+        if isinstance(group, str):
+            group = {"keywords": group}
+        kw = group.get("keywords") or []
+        if isinstance(kw, str):
+            kw = kw.split(",")
+        kw = [str(k).strip() for k in kw if str(k).strip()]
+        if kw:
+            keywords_groups.append({"keywords": kw, "multiplier": float(group.get("multiplier", 1.0))})
+    return keywords_groups
+
+
+def parse_library(data):
+    """Tuple of LoraConfig records (with combo links) from parsed library content."""
+    entries = data.get("configs", []) if isinstance(data, dict) else data
+    configs = []
+    for entry in entries or []:
+        if not isinstance(entry, dict):
+            continue
+        configs.append(normalize_config(
+            entry.get("id"),
+            entry.get("lora_name") or entry.get("path"),
+            entry.get("base_strength", 1.0),
+            entry.get("min_strength", -2.0),
+            entry.get("max_strength", 2.0),
+            entry.get("activation_tags", ""),
+            _parse_keywords(entry.get("keywords") or entry.get("keywords_groups")),
+            {str(k): float(v) for k, v in (entry.get("offsets") or {}).items()},
+            dict(entry.get("block_weights") or {}),
+        ))
+
+    # Combos get the same linking metadata DynamicLoraConfigCombiner adds
+    id_index = {c.id: i for i, c in enumerate(configs)}
+    combos = data.get("combos", []) if isinstance(data, dict) else []
+    for combo in combos or []:
+        members = [m for m in combo.get("members", []) if m in id_index]
+        if not members:
+            continue
+        mode = combo.get("mode", "all_or_none")
+        group_id = combo_group_id([configs[id_index[m]] for m in members], mode)
+        for i, member in enumerate(members):
+            configs[id_index[member]] = configs[id_index[member]].with_combo(group_id, mode, i)
+    return tuple(configs)
+
+
+class DynamicLoraConfigLibrary:
+    """Loads many LoRA configs from one JSON or TOML file.
+    The file holds a "configs" list (or is the list itself). Each entry uses the DynamicLoraConfig
+    fields: id, lora_name (or path), base_strength, min_strength, max_strength, activation_tags,
+    keywords (list of {"keywords": "a, b" or [...], "multiplier": x}), offsets ({other_id: x})
+    and block_weights. An optional "combos" list of {"members": [ids], "mode": ...} links configs
+    like DynamicLoraConfigCombiner."""
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {"required": {
+            "library_path": ("STRING", {"default": "dynamic_lora_library.json"}),
+        }}
+
+    # The same configs twice: the first output for config_N inputs of existing workflows,
+    # the second as a bundle for config_list inputs
+    RETURN_TYPES = ("DYNAMIC_LORA_CONFIG", "DYNAMIC_LORA_CONFIG_LIST")
+    RETURN_NAMES = ("configs", "config_list")
+    FUNCTION = "load_library"
+    CATEGORY = "conditioning"
+
+    @classmethod
+    def IS_CHANGED(cls, library_path):
+        try:
+            st = os.stat(cls._resolve_path(library_path))
+            return f"{st.st_mtime_ns}:{st.st_size}"
+        except OSError:
+            return float("nan")
+
+    @classmethod
+    def _resolve_path(cls, library_path):
+        """Absolute paths are used as-is, relative ones are looked up in the user and loras folders."""
+        import folder_paths
+        library_path = os.path.expanduser((library_path or "").strip())
+        if os.path.isabs(library_path):
+            return library_path
+        candidates = []
+        try:
+            candidates.append(folder_paths.get_user_directory())
+        except Exception:
+            pass
+        try:
+            candidates.extend(folder_paths.get_folder_paths("loras"))
+        except Exception:
+            pass
+        for base in candidates:
+            full = os.path.join(base, library_path)
+            if os.path.isfile(full):
+                return full
+        return library_path
+
+    def load_library(self, library_path):
+        full = self._resolve_path(library_path)
+        st = os.stat(full)
+        key = (os.path.realpath(full), st.st_mtime_ns, st.st_size)
+        configs = _LIBRARY_CACHE.get(key)
+        if configs is None:
+            configs = parse_library(read_library(full))
+            # Compile the keyword index now so the loader's first run is a cache hit
+            get_keyword_matcher(configs)
+            for old in [k for k in _LIBRARY_CACHE if k[0] == key[0]]:
+                del _LIBRARY_CACHE[old]
+            _LIBRARY_CACHE[key] = configs
+            logger.info(f"[DynamicLoraConfigLibrary] Loaded {len(configs)} configs from {full}")
+        return (configs, configs)
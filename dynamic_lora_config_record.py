@@ -0,0 +1,179 @@
+import hashlib
+import json
+from collections import namedtuple
+from .dynamic_lora_plan import ordered_block_weights
+
+KeywordGroup = namedtuple("KeywordGroup", ["keywords", "multiplier"])
+
+# Membership of a config in a combo group; index 0 is the group's primary config
+ComboMembership = namedtuple("ComboMembership", ["group", "mode", "index"])
+
+_FIELDS = ("id", "path", "base_strength", "min_strength", "max_strength", "activation_tags",
+           "keywords_groups", "offsets", "block_weights", "combo_groups")
+
+
+def _keyword_group(group):
+    if isinstance(group, dict):
+        keywords, multiplier = group.get("keywords") or (), group.get("multiplier", 1.0)
+    else:
+        keywords, multiplier = group
+    if isinstance(keywords, str):
+        keywords = keywords.split(",")
+    return KeywordGroup(tuple(str(k).strip() for k in keywords if str(k).strip()), float(multiplier))
+
+
+def _membership(m):
+    if isinstance(m, dict):
+        return ComboMembership(m.get("group"), m.get("mode", "all_or_none"), m.get("index"))
+    return ComboMembership(*m)
+
+
+def _pairs(value):
+    return value.items() if isinstance(value, dict) else (value or ())
+
+
+class LoraConfig:
+    """Immutable LoRA config passed from DynamicLoraConfig (and friends) to DynamicLoraLoader.
+    Every collection is a tuple: keywords_groups of KeywordGroup, offsets of (config id, multiplier)
+    sorted by id, block_weights of (block, weight) in BLOCK_WEIGHT_ORDER and combo_groups of
+    ComboMembership. The content hash is computed once, so configs compare and hash in O(1).
+    get() answers the keys of the config dicts earlier versions passed around."""
+
+    __slots__ = _FIELDS + ("content_hash", "keywords_key", "_hash")
+
+    def __init__(self, id, path, base_strength=1.0, min_strength=-2.0, max_strength=2.0, activation_tags=(),
+                 keywords_groups=(), offsets=(), block_weights=(), combo_groups=()):
+        if isinstance(activation_tags, str):
+            activation_tags = activation_tags.split(",")
+        if isinstance(block_weights, dict):
+            block_weights = ordered_block_weights(block_weights)
+        values = (
+            str(id) if id else str(path or ""),
+            path,
+            float(base_strength),
+            float(min_strength),
+            float(max_strength),
+            tuple(str(t).strip() for t in activation_tags if str(t).strip()),
+            tuple(g for g in (_keyword_group(g) for g in keywords_groups or ()) if g.keywords),
+            tuple(sorted((str(k), float(v)) for k, v in _pairs(offsets))),
+            tuple((str(k), v) for k, v in block_weights or ()),
+            tuple(_membership(m) for m in combo_groups or ()),
+        )
+        for name, value in zip(_FIELDS, values):
+            object.__setattr__(self, name, value)
+        digest = hashlib.sha1(json.dumps(values, default=str).encode("utf-8")).hexdigest()
+        object.__setattr__(self, "content_hash", digest)
+        object.__setattr__(self, "keywords_key", hash(values[6]))
+        object.__setattr__(self, "_hash", int(digest[:16], 16))
+
+    @classmethod
+    def from_dict(cls, d):
+        """Build from a config dict, including the _combo_* metadata of older combiner outputs."""
+        combo_groups = list(d.get("_combo_groups") or [])
+        group_id = d.get("_combo_group")
+        if group_id and all(_membership(m).group != group_id for m in combo_groups):
+            combo_groups.append((group_id, d.get("_combo_mode", "all_or_none"), d.get("_combo_index")))
+        return cls(d.get("id"), d.get("path") or d.get("lora_name"), d.get("base_strength", 1.0),
+                   d.get("min_strength", -2.0), d.get("max_strength", 2.0), d.get("activation_tags") or (),
+                   d.get("keywords_groups") or (), d.get("offsets") or (), d.get("block_weights") or (),
+                   combo_groups)
+
+    def replace(self, **changes):
+        """Copy with some fields changed."""
+        values = {name: getattr(self, name) for name in _FIELDS}
+        values.update(changes)
+        return LoraConfig(**values)
+
+    def with_combo(self, group, mode, index):
+        """Copy that also belongs to combo group group at position index."""
+        return self.replace(combo_groups=self.combo_groups + (ComboMembership(group, mode, index),))
+
+    @property
+    def combo_group(self):
+        """Most recently joined combo group, or None."""
+        return self.combo_groups[-1].group if self.combo_groups else None
+
+    def to_dict(self):
+        """The config in the dict form of earlier versions (JSON serializable)."""
+        d = {
+            "id": self.id,
+            "path": self.path,
+            "base_strength": self.base_strength,
+            "min_strength": self.min_strength,
+            "max_strength": self.max_strength,
+            "keywords_groups": [{"keywords": list(g.keywords), "multiplier": g.multiplier} for g in self.keywords_groups],
+            "offsets": dict(self.offsets),
+            "activation_tags": list(self.activation_tags),
+            "block_weights": dict(self.block_weights),
+        }
+        if self.combo_groups:
+            last = self.combo_groups[-1]
+            d["_combo_groups"] = [m._asdict() for m in self.combo_groups]
+            d["_combo_group"], d["_combo_mode"], d["_combo_index"] = last
+        return d
+
+    def get(self, key, default=None):
+        return self.to_dict().get(key, default)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("LoraConfig is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("LoraConfig is immutable")
+
+    def __reduce__(self):
+        return (LoraConfig, tuple(getattr(self, name) for name in _FIELDS))
+
+    def __eq__(self, other):
+        if not isinstance(other, LoraConfig):
+            return NotImplemented
+        return self.content_hash == other.content_hash
+
+    def __hash__(self):
+        return self._hash
+
+    def __repr__(self):
+        return f"LoraConfig(id={self.id!r}, path={self.path!r}, base_strength={self.base_strength})"
+
+
+def as_config(value):
+    """LoraConfig for a config record or legacy config dict, None for anything else."""
+    if isinstance(value, LoraConfig):
+        return value
+    if isinstance(value, dict):
+        return LoraConfig.from_dict(value)
+    return None
+
+
+def normalize_config(id, lora_name, base_strength=1.0, min_strength=-2.0, max_strength=2.0,
+                     activation_tags="", keywords_groups=None, offsets=None, block_weights=None):
+    """Build the LoraConfig record consumed by DynamicLoraLoader."""
+    # Parse activation tags
+    if isinstance(activation_tags, (list, tuple)):
+        tags = [str(t).strip() for t in activation_tags if str(t).strip()]
+    else:
+        tags = [t.strip() for t in (activation_tags or "").split(",") if t.strip()]
+    
+    return LoraConfig(id, lora_name, base_strength, min_strength, max_strength, tags,
+                      keywords_groups or (), offsets or {}, block_weights or {})
+
+
+def collect_configs(kwargs, prefix="config_"):
+    """Flatten every config, legacy dict and DYNAMIC_LORA_CONFIG_LIST bundle passed under
+    prefix-named inputs into one list of LoraConfig records."""
+    cfgs = []
+    for key, value in kwargs.items():
+        if key.startswith(prefix) and value is not None:
+            for v in value if isinstance(value, (list, tuple)) else [value]:
+                config = as_config(v)
+                if config is not None:
+                    cfgs.append(config)
+    return cfgs
+
+
+def combo_group_id(configs, mode):
+    """Stable id of a combo group: a hash of its mode and members, so it survives restarts and reloads."""
+    h = hashlib.sha1(str(mode).encode("utf-8"))
+    for c in configs:
+        h.update(c.content_hash.encode("ascii"))
+    return "combined_" + h.hexdigest()[:16]
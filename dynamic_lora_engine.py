@@ -0,0 +1,398 @@
+import itertools
+import random
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from .dynamic_lora_config_record import as_config
+from .dynamic_lora_matcher import get_keyword_matcher
+from .dynamic_lora_metrics import logger, metrics
+from .dynamic_lora_plan import (DEFAULT_STRENGTH_EPSILON, LoraPlan, PlanEntry, PlanReport, cache_plan,
+                                configs_fingerprint, get_cached_plan, lora_tag, optimize_plan,
+                                ordered_block_weights, plan_key, report_dict)
+from .dynamic_lora_randomizer import compile_template
+
+
+# Everything here is pure Python: no ComfyUI or torch imports, so plans can be resolved
+# (and tested) outside ComfyUI, e.g. by scripts/resolve_plans.py.
+
+
+_CONFIG_SET_CACHE = OrderedDict()
+_CONFIG_SET_CACHE_SIZE = 16
+
+
+class ConfigSet:
+    """A config list plus everything resolve_plan derives from the configs alone (fingerprint,
+    activation tags, combo group graph, keyword matchers), so resolving another prompt against
+    the same configs costs time proportional to what the prompt matches, not to the config count."""
+
+    def __init__(self, cfgs):
+        self.configs = tuple(cfgs)
+        self.fingerprint = configs_fingerprint(self.configs)
+        self.tags = []
+        for c in self.configs:
+            for t in c.activation_tags:
+                if t and t not in self.tags:
+                    self.tags.append(t)
+        self.known_ids = {c.id for c in self.configs if c.id}
+        # Configs without keywords are always applied
+        self.unconditional = [i for i, c in enumerate(self.configs) if not c.keywords_groups]
+        self.position = {id(c): i for i, c in enumerate(self.configs)}
+
+        # Group graph: group -> member indices / trigger ids, config index -> groups
+        self.group_members = {}
+        self.group_triggers = {}
+        self.config_groups = {}
+        for i, config in enumerate(self.configs):
+            for group_id, mode, index in config.combo_groups:
+                self.group_members.setdefault(group_id, []).append(i)
+                triggers = self.group_triggers.setdefault(group_id, set() if mode == "primary_triggers_all" else None)
+                if triggers is not None and index == 0:
+                    triggers.add(config.id)
+                self.config_groups.setdefault(i, []).append(group_id)
+        self._matchers = {}
+
+    def matcher(self, whole_word=False):
+        matcher = self._matchers.get(bool(whole_word))
+        if matcher is None:
+            matcher = self._matchers[bool(whole_word)] = get_keyword_matcher(self.configs, whole_word=whole_word)
+        return matcher
+
+    def __len__(self):
+        return len(self.configs)
+
+    def __iter__(self):
+        return iter(self.configs)
+
+    def __getitem__(self, i):
+        return self.configs[i]
+
+
+def config_set(cfgs):
+    """Cached ConfigSet for cfgs. Entries are keyed by the identity of the config objects,
+    which the cached set keeps alive, so repeated runs over the same inputs skip the precomputation."""
+    if isinstance(cfgs, ConfigSet):
+        return cfgs
+    key = tuple(map(id, cfgs))
+    cs = _CONFIG_SET_CACHE.get(key)
+    if cs is not None:
+        _CONFIG_SET_CACHE.move_to_end(key)
+        return cs
+    cs = _CONFIG_SET_CACHE[key] = ConfigSet(cfgs)
+    while len(_CONFIG_SET_CACHE) > _CONFIG_SET_CACHE_SIZE:
+        _CONFIG_SET_CACHE.popitem(last=False)
+    return cs
+
+
+def has_randomizer(text):
+    return bool(text) and compile_template(text).has_choices
+
+
+def clamp(val, mn, mx):
+    try: return max(float(mn), min(float(mx), float(val)))
+    except: return val
+
+
+def process_randomizer_codes(text, rng=random):
+    """Process {option1:option2:option3} randomizer codes in text.
+    Groups may be nested and options weighted, e.g. {3*red:{light:dark} blue}."""
+    if not text:
+        return text
+    return compile_template(text).render(rng)
+
+
+def collect_embeddings(kwargs, prefix):
+    """Collect embedding inputs with given prefix."""
+    embeddings = []
+    for key, value in kwargs.items():
+        if key.startswith(prefix) and value is not None:
+            if isinstance(value, dict):
+                embeddings.append(value)
+            elif isinstance(value, list):
+                embeddings.extend([e for e in value if isinstance(e, dict)])
+    return embeddings
+
+
+def apply_embeddings(prompt, embeddings):
+    """Apply embeddings to prompt."""
+    if not embeddings or not prompt:
+        return prompt
+
+    embedding_tags = []
+    for emb in embeddings:
+        name = emb.get("embedding_name", "")
+        weight = emb.get("weight", 1.0)
+
+        if name:
+            if weight == 1.0:
+                tag = name
+            else:
+                tag = f"({name}:{weight})"
+            embedding_tags.append(tag)
+
+    # Add embedding tags to beginning of prompt
+    if embedding_tags:
+        return " ".join(embedding_tags) + " " + prompt
+    return prompt
+
+
+def resolve_config_combinations(cfgs, configs_to_apply, strengths):
+    """Handle config combinations - when a group is triggered, activate all of its members.
+    all_or_none groups are triggered by any active member, primary_triggers_all groups only
+    by their first member. Activation propagates through configs that belong to several groups.
+    Strengths of configs pulled in by a group are written to strengths (keyed by id(config))."""
+    if not configs_to_apply:
+        return configs_to_apply
+
+    cs = config_set(cfgs)
+    group_members, group_triggers, config_groups = cs.group_members, cs.group_triggers, cs.config_groups
+    if not group_members:
+        return configs_to_apply
+
+    cfgs = cs.configs
+    position = cs.position
+    selected = [position[id(c)] for c in configs_to_apply]
+    active = set(selected)
+
+    # Propagate activation breadth-first through the group graph
+    activated_groups = []
+    activated = set()
+    queue = list(selected)
+    head = 0
+    while head < len(queue):
+        i = queue[head]
+        head += 1
+        config_id = cfgs[i].id
+        for group_id in config_groups.get(i, ()):
+            if group_id in activated:
+                continue
+            triggers = group_triggers[group_id]
+            if triggers is not None and config_id not in triggers:
+                continue
+            activated.add(group_id)
+            activated_groups.append(group_id)
+            for member in group_members[group_id]:
+                if member not in active:
+                    active.add(member)
+                    queue.append(member)
+
+    # Standalone/selected configs keep their order, group members follow in activation order
+    final = list(selected)
+    seen = set(selected)
+    known_ids = cs.known_ids
+    for group_id in activated_groups:
+        for member in group_members[group_id]:
+            if member in seen:
+                continue
+            seen.add(member)
+            final.append(member)
+
+            # Combo configs that weren't originally selected use base strength
+            # since no keyword matching occurred, plus offsets from other configs
+            config = cfgs[member]
+            final_strength = config.base_strength
+            for other_id, off_mult in config.offsets:
+                if other_id in known_ids and other_id != config.id:
+                    final_strength *= off_mult
+            strengths[id(config)] = clamp(final_strength, config.min_strength, config.max_strength)
+
+    metrics().count("combo_added", len(final) - len(selected))
+    logger.debug(f"[DynamicLoraLoader] {len(activated_groups)} of {len(group_members)} combo groups activated, "
+                 f"{len(final)} configs to apply ({len(selected)} matched)")
+    return [cfgs[i] for i in final]
+
+
+def _report_optimization(plan):
+    report = plan.report
+    if report is None:
+        return
+    metrics().count("merged", sum(len(ids) - 1 for _, ids in report.merged))
+    metrics().count("pruned", len(report.pruned))
+    if report.merged or report.pruned:
+        metrics().note("optimizer", report_dict(report))
+        logger.debug(f"[DynamicLoraLoader] Plan optimized from {report.applications_in} to "
+                     f"{report.applications_out} LoRA applications ({len(report.merged)} files merged, "
+                     f"{len(report.pruned)} pruned)")
+
+
+def resolve_plan(pos_prompt, neg_prompt, cfgs, pos_embeddings=(), neg_embeddings=(),
+                 seed=-1, whole_word_keywords=False, optimize=True, strength_epsilon=DEFAULT_STRENGTH_EPSILON):
+    """Resolve prompts, keywords, offsets and combos into a LoraPlan.
+    With optimize, the entries go through optimize_plan and the plan carries its report.
+    Plans are memoized unless unseeded randomizer codes make them non-deterministic."""
+    pos_prompt = pos_prompt or ""
+    neg_prompt = neg_prompt or ""
+    cs = config_set(cfgs)
+    deterministic = seed >= 0 or not (has_randomizer(pos_prompt) or has_randomizer(neg_prompt))
+    key = None
+    if deterministic:
+        key = plan_key(pos_prompt, neg_prompt, seed, whole_word_keywords, optimize, strength_epsilon,
+                       list(pos_embeddings), list(neg_embeddings), fingerprint=cs.fingerprint)
+        plan = get_cached_plan(key)
+        if plan is not None:
+            metrics().count("plan_cache_hit")
+            _report_optimization(plan)
+            return plan
+
+    # Process randomizer codes first
+    with metrics().stage("randomizer"):
+        rng = random.Random(seed) if seed >= 0 else random
+        pos_prompt = process_randomizer_codes(pos_prompt, rng)
+        neg_prompt = process_randomizer_codes(neg_prompt, rng)
+
+    # Apply embeddings to prompts
+    with metrics().stage("embedding"):
+        pos_prompt = apply_embeddings(pos_prompt, pos_embeddings)
+        neg_prompt = apply_embeddings(neg_prompt, neg_embeddings)
+
+    if not cs.configs:
+        plan = LoraPlan((), pos_prompt, neg_prompt)
+        return cache_plan(key, plan) if key else plan
+
+    cfgs = cs.configs
+    with metrics().stage("matching"):
+        # Add missing activation tags to positive prompt
+        pos_lower = pos_prompt.lower()
+        missing = [t for t in cs.tags if t.lower() not in pos_lower]
+        pos_out = (" ".join(missing) + " " + pos_prompt).strip() if missing else pos_prompt
+        neg_out = neg_prompt
+
+        # Calculate final strengths and filter configs that should be applied.
+        # Configs are immutable, per-run strengths live in their own dict.
+        id_map = cs.known_ids
+        configs_to_apply = []
+        strengths = {}
+
+        # Scan the prompt once for every keyword of every config
+        matches = cs.matcher(whole_word_keywords).match(pos_out)
+
+        # Only configs without keywords or with a matching keyword can apply, in config order
+        for ci in sorted(itertools.chain(cs.unconditional, matches)):
+            c = cfgs[ci]
+            base_strength = c.base_strength
+            keywords_groups = c.keywords_groups
+
+            # LoRAs that have no keywords defined are always loaded
+            if not keywords_groups:
+                strengths[id(c)] = clamp(base_strength, c.min_strength, c.max_strength)
+                configs_to_apply.append(c)
+                continue
+
+            matched_groups = matches.get(ci)
+            if not matched_groups:
+                continue
+
+            keywords_adjustments = 0.0
+            for gi in sorted(matched_groups):
+                # Apply multiplier only once per group, regardless of how many keywords match
+                kw_mult = keywords_groups[gi].multiplier
+                keywords_adjustments += (kw_mult * base_strength) - base_strength
+
+            final_strength = base_strength + keywords_adjustments
+
+            # Apply offset multipliers from other configs
+            for other_id, off_mult in c.offsets:
+                if other_id in id_map and other_id != c.id:
+                    final_strength *= off_mult
+
+            # Clamp to min/max bounds
+            strengths[id(c)] = clamp(final_strength, c.min_strength, c.max_strength)
+            configs_to_apply.append(c)
+    metrics().count("matched", len(configs_to_apply))
+    metrics().count("skipped", len(cfgs) - len(configs_to_apply))
+
+    # Resolve config combinations
+    with metrics().stage("combo_resolution"):
+        configs_to_apply = resolve_config_combinations(cs, configs_to_apply, strengths)
+
+    entries = tuple(
+        PlanEntry(c.id, c.path or c.id or "", strengths.get(id(c), 1.0), c.block_weights, c.combo_group)
+        for c in configs_to_apply
+    )
+
+    # Add LoRA tags to beginning of positive prompt (only for configs that will be applied)
+    for tag in [lora_tag(e) for e in entries]:
+        if tag not in pos_out:
+            pos_out = tag + " " + pos_out
+
+    # Prompt tags above list every config; the optimized entries are what actually gets applied
+    report = None
+    if optimize:
+        entries, report = optimize_plan(entries, strength_epsilon)
+
+    plan = LoraPlan(entries, pos_out, neg_out, report)
+    _report_optimization(plan)
+    return cache_plan(key, plan) if key else plan
+
+
+def plan_to_dict(plan):
+    """JSON-serializable form of a LoraPlan."""
+    return {
+        "pos_prompt": plan.pos_prompt,
+        "neg_prompt": plan.neg_prompt,
+        "entries": [{"id": e.id, "path": e.path, "strength": e.strength,
+                     "block_weights": dict(e.block_weights), "combo_group": e.combo_group}
+                    for e in plan.entries],
+        "report": report_dict(plan.report) if plan.report is not None else None,
+    }
+
+
+def plan_from_dict(d):
+    """LoraPlan from the output of plan_to_dict, e.g. a plan resolved by another process."""
+    entries = tuple(PlanEntry(e["id"], e["path"], float(e["strength"]),
+                              ordered_block_weights(e.get("block_weights") or {}), e.get("combo_group"))
+                    for e in d.get("entries", ()))
+    report = d.get("report")
+    if report is not None:
+        report = PlanReport(report["applications_in"], report["applications_out"],
+                            tuple((m["path"], tuple(m["ids"])) for m in report["merged"]),
+                            tuple((p["id"], p["strength"]) for p in report["pruned"]))
+    return LoraPlan(entries, d.get("pos_prompt", ""), d.get("neg_prompt", ""), report)
+
+
+# Configs and options of the worker processes of resolve_plans
+_WORKER_STATE = None
+
+
+def _init_worker(cfgs, options):
+    global _WORKER_STATE
+    _WORKER_STATE = (ConfigSet(cfgs), options)
+
+
+def _resolve_chunk(jobs):
+    cfgs, options = _WORKER_STATE
+    return [plan_to_dict(_resolve_job(job, cfgs, options)) for job in jobs]
+
+
+def _resolve_job(job, cfgs, options):
+    if isinstance(job, str):
+        job = {"pos_prompt": job}
+    seed = job.get("seed", options.get("seed", -1))
+    return resolve_plan(job.get("pos_prompt", ""), job.get("neg_prompt", options.get("neg_prompt", "")), cfgs,
+                        job.get("pos_embeddings", ()), job.get("neg_embeddings", ()), seed,
+                        options.get("whole_word_keywords", False), options.get("optimize", True),
+                        options.get("strength_epsilon", DEFAULT_STRENGTH_EPSILON))
+
+
+def resolve_plans(jobs, cfgs, workers=0, chunk_size=256, **options):
+    """Resolve many prompts against the same configs, yielding plan dicts (plan_to_dict) in job order.
+    A job is a positive prompt or a dict with pos_prompt and optionally neg_prompt, seed,
+    pos_embeddings and neg_embeddings; options (seed, neg_prompt, whole_word_keywords, optimize,
+    strength_epsilon) give the defaults. With workers > 0 jobs are resolved in chunks by that many
+    processes, each compiling the keyword matcher once."""
+    cfgs = ConfigSet(c for c in (as_config(c) for c in cfgs) if c is not None)
+    if workers <= 0:
+        for job in jobs:
+            yield plan_to_dict(_resolve_job(job, cfgs, options))
+        return
+
+    jobs = iter(jobs)
+    chunks = iter(lambda: list(itertools.islice(jobs, chunk_size)), [])
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(cfgs.configs, options)) as pool:
+        # Keep a bounded number of chunks in flight so huge inputs stream instead of piling up
+        pending = [pool.submit(_resolve_chunk, c) for c in itertools.islice(chunks, workers * 2)]
+        while pending:
+            done = pending.pop(0).result()
+            nxt = next(chunks, None)
+            if nxt is not None:
+                pending.append(pool.submit(_resolve_chunk, nxt))
+            yield from done
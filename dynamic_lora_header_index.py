@@ -0,0 +1,241 @@
+import gzip
+import json
+import os
+import struct
+import threading
+from .dynamic_lora_metrics import logger
+
+INDEX_VERSION = 2
+INDEX_FILENAME = "dynamic_lora_header_index.json.gz"
+
+UNET_PREFIXES = ("lora_unet_", "lora_transformer_", "lora_prior_unet_", "diffusion_model.", "unet.", "transformer.",
+                 "model.diffusion_model.")
+TE_PREFIXES = ("lora_te", "text_encoder", "te_", "te1_", "te2_", "clip_l.", "clip_g.", "t5xxl.")
+_DOWN_SUFFIXES = (".lora_down.weight", ".lora_A.weight", ".down.weight")
+
+
+def read_safetensors_header(path):
+    """Read only the JSON header of a safetensors file: (tensor header, metadata)."""
+    with open(path, "rb") as f:
+        raw = f.read(8)
+        if len(raw) != 8:
+            raise ValueError(f"{path} is not a safetensors file")
+        (length,) = struct.unpack("<Q", raw)
+        if length > 100 * 1024 * 1024:
+            raise ValueError(f"{path} has an implausible safetensors header")
+        header = json.loads(f.read(length))
+    metadata = header.pop("__metadata__", None) or {}
+    return header, metadata
+
+
+# Input width of the UNet cross-attention key projection, i.e. the text embedding size
+_CONTEXT_WIDTH_ARCH = {768: "sd1", 1024: "sd2", 2048: "sdxl"}
+
+
+def _context_width(header):
+    for k, v in header.items():
+        if "attn2" in k and "to_k" in k and k.endswith(_DOWN_SUFFIXES) and not k.startswith(TE_PREFIXES):
+            shape = v.get("shape") or []
+            if len(shape) == 2:
+                return int(shape[1])
+    return None
+
+
+def _guess_arch(header, metadata):
+    base = str(metadata.get("ss_base_model_version", "")).lower()
+    for name, arch in (("sdxl", "sdxl"), ("flux", "flux"), ("sd3", "sd3"), ("sd_v2", "sd2"), ("sd_v1", "sd1")):
+        if name in base:
+            return arch
+    joined = "\n".join(header)
+    if "double_blocks" in joined or "single_blocks" in joined or "single_transformer_blocks" in joined:
+        return "flux"
+    if "joint_blocks" in joined:
+        return "sd3"
+    # Key names don't tell SD1/SD2/SDXL UNets apart reliably (diffusers names are shared), the
+    # cross-attention width does
+    arch = _CONTEXT_WIDTH_ARCH.get(_context_width(header))
+    if arch:
+        return arch
+    if "lora_te2_" in joined or "lora_unet_input_blocks" in joined or "lora_unet_output_blocks" in joined:
+        return "sdxl"
+    if "lora_unet_down_blocks" in joined or "lora_te_text_model" in joined:
+        return "sd1"
+    return "unknown"
+
+
+def summarize_header(header, metadata):
+    """Index entry for one LoRA: key shapes/dtypes plus derived targets, rank and architecture."""
+    keys = sorted(header)
+    rank = 0
+    for k in keys:
+        if k.endswith(_DOWN_SUFFIXES):
+            shape = header[k].get("shape") or [0]
+            rank = max(rank, int(shape[0]))
+    return {
+        "tensors": {k: [header[k].get("shape"), header[k].get("dtype")] for k in keys},
+        "metadata": metadata,
+        "has_unet": any(k.startswith(UNET_PREFIXES) for k in keys),
+        "has_te": any(k.startswith(TE_PREFIXES) for k in keys),
+        "rank": rank,
+        "arch": _guess_arch(header, metadata),
+    }
+
+
+def model_arch(model):
+    """Architecture family of a ComfyUI MODEL, in the same vocabulary as the index."""
+    try:
+        name = type(model.model.model_config).__name__.lower()
+    except AttributeError:
+        return "unknown"
+    if name.startswith("sdxl") or name in ("ssd1b", "segmind_vega", "koala_700m", "koala_1b"):
+        return "sdxl"
+    if name.startswith("sd15") or name.startswith("sd1"):
+        return "sd1"
+    if name.startswith("sd2"):
+        return "sd2"
+    if name.startswith("flux"):
+        return "flux"
+    if name.startswith("sd3"):
+        return "sd3"
+    return "unknown"
+
+
+def is_compatible(info, model):
+    """False only when both the LoRA and the model architecture are known and differ."""
+    if not info or model is None:
+        return True
+    lora = info.get("arch", "unknown")
+    target = model_arch(model)
+    return lora == "unknown" or target == "unknown" or lora == target
+
+
+def lora_targets(info):
+    """(patch_model, patch_clip) for an index entry. A side is only skipped when the LoRA
+    positively targets the other one; files with unrecognised key names patch both."""
+    if not info:
+        return True, True
+    has_unet, has_te = info.get("has_unet", True), info.get("has_te", True)
+    if has_unet == has_te:
+        return True, True
+    return has_unet, has_te
+
+
+class LoraHeaderIndex:
+    """Persistent index of safetensors headers under the "loras" folders, refreshed by mtime/size."""
+
+    def __init__(self, index_path=None):
+        self.index_path = index_path or self._default_path()
+        self._entries = {}
+        self._lock = threading.RLock()
+        self._dirty = False
+        self._scan_thread = None
+        self._load()
+
+    @staticmethod
+    def _default_path():
+        try:
+            import folder_paths
+            base = folder_paths.get_user_directory()
+        except Exception:
+            base = os.path.dirname(os.path.abspath(__file__))
+        return os.path.join(base, INDEX_FILENAME)
+
+    def _load(self):
+        try:
+            with gzip.open(self.index_path, "rt", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == INDEX_VERSION:
+                self._entries = data.get("entries", {})
+        except Exception:
+            # Missing, truncated (EOFError) or otherwise unreadable: rebuild it from scratch
+            self._entries = {}
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            # Snapshot, a background scan may add entries while we serialize
+            data = {"version": INDEX_VERSION, "entries": dict(self._entries)}
+            self._dirty = False
+        # Scan threads and other ComfyUI processes sharing the user directory save concurrently
+        tmp = f"{self.index_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+            with gzip.open(tmp, "wt", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp, self.index_path)
+        except OSError as e:
+            logger.warning(f"[DynamicLoraLoader] Could not save LoRA header index: {e}")
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+    def lookup(self, full_path):
+        """Index entry for a LoRA file, reading its header now if it's new or changed.
+        Returns None for missing or non-safetensors files."""
+        try:
+            st = os.stat(full_path)
+        except OSError:
+            return None
+        key = os.path.realpath(full_path)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and entry["mtime_ns"] == st.st_mtime_ns and entry["size"] == st.st_size:
+            return entry
+        if not key.lower().endswith(".safetensors"):
+            return None
+        try:
+            header, metadata = read_safetensors_header(key)
+        except (OSError, ValueError) as e:
+            logger.warning(f"[DynamicLoraLoader] Could not read header of {full_path}: {e}")
+            return None
+        entry = summarize_header(header, metadata)
+        entry["mtime_ns"] = st.st_mtime_ns
+        entry["size"] = st.st_size
+        with self._lock:
+            self._entries[key] = entry
+            self._dirty = True
+        return entry
+
+    def scan(self):
+        """Index every LoRA in the loras folders, dropping entries for deleted files."""
+        try:
+            import folder_paths
+            names = folder_paths.get_filename_list("loras") or []
+        except Exception:
+            names = []
+        seen = set()
+        for name in names:
+            full = folder_paths.get_full_path("loras", name)
+            if full:
+                seen.add(os.path.realpath(full))
+                self.lookup(full)
+        with self._lock:
+            for key in [k for k in self._entries if k not in seen and not os.path.exists(k)]:
+                del self._entries[key]
+                self._dirty = True
+        self.save()
+
+    def scan_in_background(self):
+        """Start a daemon scan unless one is already running."""
+        with self._lock:
+            if self._scan_thread is not None and self._scan_thread.is_alive():
+                return
+            self._scan_thread = threading.Thread(target=self.scan, name="DynamicLoraHeaderScan", daemon=True)
+            self._scan_thread.start()
+
+
+_HEADER_INDEX = None
+_HEADER_INDEX_LOCK = threading.Lock()
+
+
+def header_index(start_scan=True):
+    """The shared header index, kicking off a background scan on first use."""
+    global _HEADER_INDEX
+    with _HEADER_INDEX_LOCK:
+        if _HEADER_INDEX is None:
+            _HEADER_INDEX = LoraHeaderIndex()
+            if start_scan:
+                _HEADER_INDEX.scan_in_background()
+    return _HEADER_INDEX
@@ -1,15 +1,30 @@
 import os
-import re
 import random
+from collections import OrderedDict
 from functools import reduce
 from operator import mul
-import folder_paths
-from nodes import LoraLoader, CLIPTextEncode
+from .dynamic_lora_blocks import key_filter
+from .dynamic_lora_cache import file_cache_key, filtered_state_dict, lora_cache
+from .dynamic_lora_conditioning import conditioning_cache
+from .dynamic_lora_config_record import collect_configs
+from .dynamic_lora_engine import (apply_embeddings, clamp, collect_embeddings, has_randomizer,
+                                  process_randomizer_codes, resolve_config_combinations, resolve_plan)
+from .dynamic_lora_metrics import logger, metrics
+from .dynamic_lora_prefetch import prefetcher
+from .dynamic_lora_plan import DEFAULT_STRENGTH_EPSILON, plan_key
+
+# ComfyUI (folder_paths, nodes, comfy.*) is only imported once a plan is applied, so importing
+# this module, and resolving plans, works without a running ComfyUI
+
+# Base MODEL/CLIP pairs whose patch state a loader node remembers
+_MAX_PATCH_STATES = 4
+
 
 class DynamicLoraLoader:
     """Takes MODEL, pos/neg prompts, optional CLIP, dynamic list of configs and embeddings.
     Supports randomizer codes like {tall:short:skinny:fat} and config combinations.
-    Outputs modified (MODEL, CLIP, pos_prompt_out, neg_prompt_out)."""
+    Outputs modified (MODEL, CLIP, pos_prompt_out, neg_prompt_out), a JSON trace of the run and,
+    with encode_prompts, the encoded positive/negative conditioning (served from a cache on repeats)."""
 
     @classmethod
     def INPUT_TYPES(cls):
@@ -20,11 +35,22 @@ class DynamicLoraLoader:
         }
         optional = {
             "clip": ("CLIP",),
+            "seed": ("INT", {"default": -1, "min": -1, "max": 0xffffffffffffffff}),
+            "whole_word_keywords": ("BOOLEAN", {"default": False}),
+            "merge_cache": ("BOOLEAN", {"default": False}),
+            "encode_prompts": ("BOOLEAN", {"default": False}),
+            # Merge applications of the same file, drop near-zero strengths and apply in a stable order
+            "optimize_plan": ("BOOLEAN", {"default": True}),
+            "strength_epsilon": ("FLOAT", {"default": DEFAULT_STRENGTH_EPSILON, "min": 0.0, "max": 1.0, "step": 0.0001}),
         }
         
         # Create multiple config inputs for auto-expansion
         for i in range(1, 11):  # Start with 10 potential config slots
             optional[f"config_{i}"] = ("DYNAMIC_LORA_CONFIG",)
+
+        # Bundles of any number of configs (Config Combiner / Config Library)
+        for i in range(1, 4):
+            optional[f"config_list_{i}"] = ("DYNAMIC_LORA_CONFIG_LIST",)
         
         # Create multiple positive embedding inputs
         for i in range(1, 6):
@@ -36,7 +62,8 @@ class DynamicLoraLoader:
         
         return {"required": required, "optional": optional}
 
-    RETURN_TYPES = ("MODEL", "CLIP", "STRING", "STRING",)
+    RETURN_TYPES = ("MODEL", "CLIP", "STRING", "STRING", "STRING", "CONDITIONING", "CONDITIONING",)
+    RETURN_NAMES = ("model", "clip", "pos_prompt", "neg_prompt", "trace", "positive", "negative",)
     FUNCTION = "build_model_clip_and_prompts"
     CATEGORY = "conditioning"
 
@@ -44,275 +71,220 @@ class DynamicLoraLoader:
         return reduce(mul, iterable, 1.0) if iterable else 1.0
 
     def _clamp(self, val, mn, mx):
-        try: return max(float(mn), min(float(mx), float(val)))
-        except: return val
+        return clamp(val, mn, mx)
 
-    def _process_randomizer_codes(self, text):
-        """Process {option1:option2:option3} randomizer codes in text."""
-        if not text:
-            return text
-            
-        def replace_randomizer(match):
-            options = match.group(1).split(':')
-            # Filter out empty options
-            options = [opt.strip() for opt in options if opt.strip()]
-            return random.choice(options) if options else ""
-        
-        # Find and replace all {option1:option2:...} patterns
-        pattern = r'\{([^}]+)\}'
-        result = re.sub(pattern, replace_randomizer, text)
-        return result
+    # Plan resolution lives in dynamic_lora_engine, which has no ComfyUI imports
+
+    def _process_randomizer_codes(self, text, rng=random):
+        return process_randomizer_codes(text, rng)
 
     def _collect_embeddings(self, kwargs, prefix):
-        """Collect embedding inputs with given prefix."""
-        embeddings = []
-        for key, value in kwargs.items():
-            if key.startswith(prefix) and value is not None:
-                if isinstance(value, dict):
-                    embeddings.append(value)
-                elif isinstance(value, list):
-                    embeddings.extend([e for e in value if isinstance(e, dict)])
-        return embeddings
+        return collect_embeddings(kwargs, prefix)
 
     def _apply_embeddings(self, prompt, embeddings):
-        """Apply embeddings to prompt."""
-        if not embeddings or not prompt:
-            return prompt
-            
-        embedding_tags = []
-        for emb in embeddings:
-            name = emb.get("embedding_name", "")
-            weight = emb.get("weight", 1.0)
-            
-            if name:
-                if weight == 1.0:
-                    tag = name
-                else:
-                    tag = f"({name}:{weight})"
-                embedding_tags.append(tag)
-        
-        # Add embedding tags to beginning of prompt
-        if embedding_tags:
-            return " ".join(embedding_tags) + " " + prompt
-        return prompt
-
-    def _resolve_config_combinations(self, cfgs, configs_to_apply):
-        """Handle config combinations - when one config in a group is activated, activate all."""
-        if not configs_to_apply:
-            return configs_to_apply
-            
-        print(f"[DynamicLoraLoader] Resolving combinations. Original configs to apply: {len(configs_to_apply)}")
-        
-        # Group configs by combo group
-        combo_groups = {}
-        standalone_configs = []
-        
-        for config in cfgs:
-            group_id = config.get("_combo_group")
-            if group_id:
-                if group_id not in combo_groups:
-                    combo_groups[group_id] = []
-                combo_groups[group_id].append(config)
-                print(f"[DynamicLoraLoader] Config {config.get('id')} belongs to combo group {group_id}")
-            else:
-                standalone_configs.append(config)
-        
-        print(f"[DynamicLoraLoader] Found {len(combo_groups)} combo groups and {len(standalone_configs)} standalone configs")
-        
-        # Check which combo groups have at least one activated config
-        activated_groups = set()
-        applied_ids = {c.get("id") for c in configs_to_apply}
-        
-        for group_id, group_configs in combo_groups.items():
-            group_ids = {c.get("id") for c in group_configs}
-            if group_ids.intersection(applied_ids):
-                activated_groups.add(group_id)
-                print(f"[DynamicLoraLoader] Activating combo group {group_id} due to matching config(s)")
-        
-        # Build final list of configs to apply
-        final_configs = []
-        
-        # Add standalone configs that were already selected
-        for config in standalone_configs:
-            if config in configs_to_apply:
-                final_configs.append(config)
-        
-        # Add all configs from activated combo groups
-        for group_id in activated_groups:
-            for config in combo_groups[group_id]:
-                # Calculate final strength for combo configs that weren't originally selected
-                if config not in configs_to_apply:
-                    print(f"[DynamicLoraLoader] Adding combo config {config.get('id')} that wasn't originally selected")
-                    # Use base strength since no keyword matching occurred
-                    base_strength = float(config.get("base_strength", 1.0))
-                    
-                    # Apply offset multipliers from other configs
-                    id_map = {c.get("id"): c for c in cfgs if c.get("id")}
-                    final_strength = base_strength
-                    for other_id, off_mult in (config.get("offsets") or {}).items():
-                        if other_id in id_map and other_id != config.get("id"):
-                            try: 
-                                final_strength *= float(off_mult)
-                            except: 
-                                pass
-                    
-                    final_strength = self._clamp(final_strength, 
-                                               config.get("min_strength", -2.0), 
-                                               config.get("max_strength", 2.0))
-                    config["final_strength"] = final_strength
-                
-                final_configs.append(config)
-        
-        print(f"[DynamicLoraLoader] Final configs to apply: {len(final_configs)}")
-        return final_configs
+        return apply_embeddings(prompt, embeddings)
 
-    def build_model_clip_and_prompts(self, model, pos_prompt, neg_prompt, clip=None, **kwargs):
-        # Process randomizer codes first
-        pos_prompt = self._process_randomizer_codes(pos_prompt or "")
-        neg_prompt = self._process_randomizer_codes(neg_prompt or "")
-        
-        # Collect embedding inputs
-        pos_embeddings = self._collect_embeddings(kwargs, "pos_embedding_")
-        neg_embeddings = self._collect_embeddings(kwargs, "neg_embedding_")
-        
-        # Apply embeddings to prompts
-        pos_prompt = self._apply_embeddings(pos_prompt, pos_embeddings)
-        neg_prompt = self._apply_embeddings(neg_prompt, neg_embeddings)
-        
-        # Collect all config inputs from numbered parameters
-        cfgs = []
-        for key, value in kwargs.items():
-            if key.startswith("config_") and value is not None:
-                if isinstance(value, dict):
-                    cfgs.append(value)
-                elif isinstance(value, list):
-                    cfgs.extend([c for c in value if isinstance(c, dict)])
-
-        if not cfgs:
-            return (model, clip, pos_prompt, neg_prompt)
-
-        # Collect activation tags from all configs
-        tags = []
-        for c in cfgs:
-            for t in c.get("activation_tags", []):
-                if t and t not in tags: 
-                    tags.append(t)
-
-        # Add missing activation tags to positive prompt
-        pos_lower = pos_prompt.lower()
-        missing = [t for t in tags if t.lower() not in pos_lower]
-        pos_out = (" ".join(missing) + " " + pos_prompt).strip() if missing else pos_prompt
-        neg_out = neg_prompt
-
-        # Calculate final strengths and filter configs that should be applied
-        id_map = {c.get("id"): c for c in cfgs if c.get("id")}
-        configs_to_apply = []
-        
-        for c in cfgs:
-            base_strength = float(c.get("base_strength", 1.0))
-            keywords_groups = c.get("keywords_groups") or []
-            
-            # Skip LoRAs that have no keywords defined - we only load LoRAs with matching keywords
-            if not keywords_groups:
-                final_strength = self._clamp(base_strength, c.get("min_strength", -2.0), c.get("max_strength", 2.0))
-                c["final_strength"] = final_strength
-                configs_to_apply.append(c)
-                continue
-            
-            # Check if any keyword group matches the prompt
-            any_group_matches = False
-            keywords_adjustments = 0.0
-            
-            for kw_group in keywords_groups:
-                keywords_list = kw_group.get("keywords", [])
-                group_matches = any(kw.lower() in pos_out.lower() for kw in keywords_list if kw)
-                
-                if group_matches:
-                    any_group_matches = True
-                    # Apply multiplier only once per group, regardless of how many keywords match
-                    kw_mult = float(kw_group.get("multiplier", 1.0))
-                    keywords_adjustments += (kw_mult * base_strength) - base_strength
-            
-            # Skip this LoRA if none of its keywords match
-            if not any_group_matches:
-                continue
-                
-            final_strength = base_strength + keywords_adjustments
-            
-            # Apply offset multipliers from other configs
-            for other_id, off_mult in (c.get("offsets") or {}).items():
-                if other_id in id_map and other_id != c.get("id"):
-                    try: 
-                        final_strength *= float(off_mult)
-                    except: 
-                        pass
-            
-            # Clamp to min/max bounds
-            final_strength = self._clamp(final_strength, c.get("min_strength", -2.0), c.get("max_strength", 2.0))
-            c["final_strength"] = final_strength
-            configs_to_apply.append(c)
-
-        # Resolve config combinations
-        configs_to_apply = self._resolve_config_combinations(cfgs, configs_to_apply)
-
-        # Generate LoRA tags for prompt (only for configs that will be applied)
-        lora_tags = []
-        bw_order = ["IN00_fine_texture","IN01_low_level_edges","IN02_detail_refinement","MID_global_structure",
-                    "OUT00_object_features","OUT01_mid_level_semantics","OUT02_higher_semantics","OUT03_composition",
-                    "OUT04_style_refinement","OUT05_global_meaning","OUT06_late_abstraction","OUT07_final_pass"]
-
-        for c in configs_to_apply:
-            path = c.get("path") or c.get("id") or ""
-            strength = c.get("final_strength", 1.0)
-            bw = c.get("block_weights") or {}
-            
-            # Build block weights list in correct order
-            bw_list = []
-            for k in bw_order:
-                if k in bw:
-                    try: 
-                        bw_list.append(str(float(bw.get(k))))
-                    except: 
-                        bw_list.append(str(bw.get(k)))
-            
-            # Create LoRA tag
-            tag = f"<lora:{path}:{strength}" + (":" + ",".join(bw_list) if bw_list else "") + ">"
-            lora_tags.append(tag)
+    def _resolve_config_combinations(self, cfgs, configs_to_apply, strengths):
+        return resolve_config_combinations(cfgs, configs_to_apply, strengths)
 
-        # Add LoRA tags to beginning of positive prompt
-        for tag in lora_tags:
-            if tag not in pos_out: 
-                pos_out = tag + " " + pos_out
+    def _collect_configs(self, kwargs):
+        """Collect all config and config list inputs as LoraConfig records."""
+        return collect_configs(kwargs)
 
-        # Initialize CLIP if not provided
-        if clip is None:
-            try:
-                clip = CLIPTextEncode().encode(None, pos_out)[0]
-            except Exception as e:
-                print(f"[DynamicLoraLoader] CLIPTextEncode failed: {e}")
-                clip = None
-
-        # Apply LoRA models to the model and clip (only for configs that matched keywords or were combo-activated)
-        for c in configs_to_apply:
-            lora_filename = c.get("path") or c.get("id")
+    @classmethod
+    def IS_CHANGED(cls, pos_prompt="", neg_prompt="", seed=-1, whole_word_keywords=False,
+                   optimize_plan=True, strength_epsilon=DEFAULT_STRENGTH_EPSILON, **kwargs):
+        # Unseeded randomizer codes never produce the same prompt twice. Linked inputs arrive as
+        # None; ComfyUI re-runs the node when their upstream value changes
+        if seed is not None and seed < 0 and (has_randomizer(pos_prompt) or has_randomizer(neg_prompt)):
+            return float("nan")
+        return plan_key(pos_prompt, neg_prompt, seed, whole_word_keywords, optimize_plan, strength_epsilon,
+                        collect_embeddings(kwargs, "pos_embedding_"),
+                        collect_embeddings(kwargs, "neg_embedding_"),
+                        cfgs=collect_configs(kwargs))
+
+    def resolve_plan(self, pos_prompt, neg_prompt, cfgs, pos_embeddings=(), neg_embeddings=(),
+                     seed=-1, whole_word_keywords=False, optimize=True, strength_epsilon=DEFAULT_STRENGTH_EPSILON):
+        """Resolve prompts, keywords, offsets and combos into a LoraPlan (see dynamic_lora_engine.resolve_plan)."""
+        return resolve_plan(pos_prompt, neg_prompt, cfgs, pos_embeddings, neg_embeddings,
+                            seed, whole_word_keywords, optimize, strength_epsilon)
+
+    def _patch_state(self, model, clip):
+        """PatchState for these MODEL/CLIP inputs; a new base model means a full rebuild."""
+        from .dynamic_lora_patcher import PatchState
+        states = self.__dict__.setdefault("_patch_states", OrderedDict())
+        key = (id(model), id(clip))
+        state = states.get(key)
+        if state is None or not state.matches(model, clip):
+            state = states[key] = PatchState(model, clip)
+        states.move_to_end(key)
+        while len(states) > _MAX_PATCH_STATES:
+            states.popitem(last=False)
+        return state
+
+    def _plan_files(self, model, clip, plan, skip_zero=True):
+        """Resolve plan entries to LoRA files on disk, using the header index to drop
+        incompatible files and decide what each one patches. No tensors are read.
+        Entries at strength 0 are dropped unless skip_zero is False."""
+        import folder_paths
+        from .dynamic_lora_header_index import header_index, is_compatible, lora_targets, model_arch
+        index = header_index()
+        # Block weights are applied with the model's block layout, so zero-weight blocks are filtered with it too
+        target_arch = model_arch(model) if model is not None else "unknown"
+        files = []
+        occurrences = {}
+        for e in plan.entries:
+            lora_filename = e.path
             if not lora_filename: 
                 continue
                 
             full = folder_paths.get_full_path("loras", lora_filename)
             if not full or not os.path.exists(full):
-                print(f"[DynamicLoraLoader] LoRA file not found: {lora_filename}")
+                logger.warning(f"[DynamicLoraLoader] LoRA file not found: {lora_filename}")
+                metrics().count("missing")
                 continue
                 
+            if skip_zero and e.strength == 0:
+                continue
+
+            # Header index tells us what the file targets before any tensor is read
+            info = index.lookup(full)
+            if not is_compatible(info, model):
+                logger.info(f"[DynamicLoraLoader] Skipping LoRA {e.id}: built for {info.get('arch')}, "
+                            f"model is {model_arch(model)}")
+                metrics().count("incompatible")
+                continue
+            patch_model, patch_clip = lora_targets(info)
+            patch_model = patch_model and model is not None
+            patch_clip = patch_clip and clip is not None
+            arch = target_arch
+            if arch == "unknown":
+                arch = info.get("arch", "sdxl") if info else "sdxl"
+            file_key = file_cache_key(full)
+            n = occurrences[file_key] = occurrences.get(file_key, -1) + 1
+            files.append((e, full, (file_key, n, patch_model, patch_clip), arch))
+        index.save()
+        return files
+
+    def apply_plan(self, model, clip, plan, merge_cache=False):
+        """Patch MODEL and CLIP with every entry of plan, reusing the previous
+        result when the same inputs are patched with the same plan again.
+        With merge_cache, fused patch sets are read from / written to the on-disk merge cache.
+        The text encoder LoRAs that ended up in CLIP are recorded for the conditioning cache."""
+        from .dynamic_lora_merge_cache import merge_cache as get_merge_cache, merge_key
+        from .dynamic_lora_patcher import LoraApplication, add_passes
+        last = getattr(self, "_last_applied", None)
+        if last is not None and last[0] == plan.entries and last[1] is model and last[2] is clip:
+            logger.debug("[DynamicLoraLoader] LoRA plan unchanged, reusing patched model")
+            metrics().count("patch_reused")
+            return last[3], last[4]
+
+        with metrics().stage("file_io"):
+            files = self._plan_files(model, clip, plan)
+
+        cache_key = None
+        if merge_cache and files:
             try:
-                out = LoraLoader().load_lora(model=model, clip=clip,
-                                             lora_name=lora_filename,  # Use filename, not full path
-                                             strength_model=c["final_strength"],
-                                             strength_clip=c["final_strength"])
-                if isinstance(out, (tuple,list)) and len(out)>=2:
-                    model, clip = out[0], out[1]
-                    combo_info = f" (combo: {c.get('_combo_group', 'none')})" if c.get("_combo_group") else ""
-                    print(f"[DynamicLoraLoader] Applied LoRA {c.get('id')} with strength {c['final_strength']}{combo_info}")
-            except Exception as e:
-                print(f"[DynamicLoraLoader] Failed to apply LoRA {c.get('id')}: {e}")
-
-        return (model, clip, pos_out, neg_out)
\ No newline at end of file
+                specs = [[list(key[0]), key[1], key[2], key[3], e.strength, list(e.block_weights)]
+                         for e, _, key, _ in files]
+                cache_key = merge_key(model, clip, specs)
+                with metrics().stage("file_io"):
+                    passes = get_merge_cache().load(cache_key, source_bytes=sum(key[0][2] for _, _, key, _ in files))
+            except Exception as ex:
+                logger.warning(f"[DynamicLoraLoader] Merge cache lookup failed: {ex}")
+                cache_key, passes = None, None
+            if passes is not None:
+                with metrics().stage("patching"):
+                    out_model, out_clip = add_passes(model, clip, passes,
+                                                     any(key[2] for _, _, key, _ in files),
+                                                     any(key[3] for _, _, key, _ in files))
+                metrics().count("applied", len(files))
+                metrics().count("merge_cache_hit")
+                logger.info(f"[DynamicLoraLoader] Applied {len(files)} LoRAs from merge cache "
+                            f"(hit rate {get_merge_cache().stats()['hit_rate']:.0%})")
+                te_plan = tuple((key[0], key[1], e.strength) for e, _, key, _ in files if key[3])
+                self._last_applied = (plan.entries, model, clip, out_model, out_clip, te_plan)
+                return out_model, out_clip
+
+        # Keys in zero-weight blocks or modules we won't patch are never read
+        keeps = [key_filter(e.block_weights, key[2], key[3], arch) for e, _, key, arch in files]
+
+        # Start reading every file in parallel; patching below consumes them as they arrive
+        prefetcher().prefetch([(full, keep) for (_, full, _, _), keep in zip(files, keeps)])
+
+        # Load LoRA tensors (only for configs that matched keywords or were combo-activated)
+        loras = []
+        with metrics().stage("file_io"):
+            for (e, full, key, arch), keep in zip(files, keeps):
+                _, _, patch_model, patch_clip = key
+                try:
+                    # Tensors come from the shared cache instead of being re-read from disk
+                    lora = filtered_state_dict(lora_cache().get(full), keep)
+                    loras.append(LoraApplication(key, lora, e.strength, patch_model, patch_clip, e.block_weights))
+                    combo_info = f" (combo: {e.combo_group})" if e.combo_group else ""
+                    logger.debug(f"[DynamicLoraLoader] Applying LoRA {e.id} with strength {e.strength}{combo_info}")
+                except Exception as ex:
+                    logger.warning(f"[DynamicLoraLoader] Failed to load LoRA {e.id}: {ex}")
+                    metrics().count("failed")
+
+        # Patch MODEL and CLIP with the combined patch set of every selected LoRA. The patch state
+        # of these inputs is kept, so the next run only touches LoRAs that were added, removed or rescaled.
+        out_model, out_clip = model, clip
+        try:
+            with metrics().stage("patching"):
+                state = self._patch_state(model, clip)
+                out_model, out_clip = state.update(loras)
+            metrics().count("applied", len(loras))
+        except Exception as ex:
+            logger.warning(f"[DynamicLoraLoader] Failed to apply LoRAs: {ex}")
+            self._patch_states.pop((id(model), id(clip)), None)
+        else:
+            if cache_key is not None and len(loras) == len(files):
+                try:
+                    if not get_merge_cache().store(cache_key, state.current_passes()):
+                        logger.info("[DynamicLoraLoader] Plan has non-LoRA patches, not stored in merge cache")
+                except Exception as ex:
+                    logger.warning(f"[DynamicLoraLoader] Could not write merge cache entry: {ex}")
+
+        te_plan = tuple((l.key[0], l.key[1], l.strength) for l in loras if l.patch_clip) if out_clip is not clip else ()
+        self._last_applied = (plan.entries, model, clip, out_model, out_clip, te_plan)
+        return out_model, out_clip
+
+    def _encode(self, base_clip, te_plan, clip, text):
+        """Encode text with the patched clip, or reuse the conditioning of an earlier identical run."""
+        from nodes import CLIPTextEncode
+        cache = conditioning_cache()
+        cond = cache.get(base_clip, te_plan, text)
+        if cond is not None:
+            metrics().count("conditioning_cache_hit")
+            return cond
+        metrics().count("conditioning_cache_miss")
+        cond = CLIPTextEncode().encode(clip, text)[0]
+        cache.put(base_clip, te_plan, text, cond)
+        return cond
+
+    def build_model_clip_and_prompts(self, model, pos_prompt, neg_prompt, clip=None, seed=-1,
+                                     whole_word_keywords=False, merge_cache=False, encode_prompts=False,
+                                     optimize_plan=True, strength_epsilon=DEFAULT_STRENGTH_EPSILON, **kwargs):
+        base_clip = clip
+        positive = negative = None
+        with metrics().run() as trace:
+            # Collect embedding and config inputs
+            pos_embeddings = self._collect_embeddings(kwargs, "pos_embedding_")
+            neg_embeddings = self._collect_embeddings(kwargs, "neg_embedding_")
+            cfgs = self._collect_configs(kwargs)
+            trace.count("configs", len(cfgs))
+
+            plan = self.resolve_plan(pos_prompt, neg_prompt, cfgs, pos_embeddings, neg_embeddings,
+                                     seed, whole_word_keywords, optimize_plan, strength_epsilon)
+            te_plan = ()
+            if cfgs:
+                # Without a CLIP only the MODEL is patched
+                model, clip = self.apply_plan(model, clip, plan, merge_cache)
+                te_plan = self._last_applied[5]
+
+            if encode_prompts and clip is not None:
+                with metrics().stage("encoding"):
+                    positive = self._encode(base_clip, te_plan, clip, plan.pos_prompt)
+                    negative = self._encode(base_clip, te_plan, clip, plan.neg_prompt)
+        return (model, clip, plan.pos_prompt, plan.neg_prompt, trace.to_json(), positive, negative)
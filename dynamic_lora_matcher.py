@@ -0,0 +1,111 @@
+from collections import OrderedDict
+
+_MATCHER_CACHE = OrderedDict()
+_MATCHER_CACHE_SIZE = 32
+
+
+def _is_word_char(ch):
+    return ch.isalnum() or ch == "_"
+
+
+def keyword_fingerprint(cfgs):
+    """Fingerprint of the keyword groups of a config set (order sensitive)."""
+    return hash(tuple(c.keywords_key for c in cfgs))
+
+
+class KeywordMatcher:
+    """Aho-Corasick automaton over every keyword of every group of a config set.
+    Scans a lowered prompt once and reports all matching (config, group) pairs."""
+
+    def __init__(self, cfgs, whole_word=False):
+        self.whole_word = whole_word
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        self._patterns = []  # pattern index -> (length, [(config_idx, group_idx), ...])
+
+        pattern_ids = {}
+        for ci, c in enumerate(cfgs):
+            for gi, group in enumerate(c.keywords_groups):
+                for kw in group.keywords:
+                    kw = str(kw).lower()
+                    if not kw:
+                        continue
+                    pid = pattern_ids.get(kw)
+                    if pid is None:
+                        pid = pattern_ids[kw] = len(self._patterns)
+                        self._patterns.append((len(kw), []))
+                        self._add(kw, pid)
+                    targets = self._patterns[pid][1]
+                    if (ci, gi) not in targets:
+                        targets.append((ci, gi))
+        self._build()
+
+    def _add(self, word, pid):
+        state = 0
+        for ch in word:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = nxt
+        self._out[state].append(pid)
+
+    def _build(self):
+        queue = list(self._goto[0].values())
+        head = 0
+        while head < len(queue):
+            state = queue[head]
+            head += 1
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = self._fail[state]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                target = self._goto[f].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def match(self, text):
+        """Return {config_idx: set(group_idx)} for every keyword found in text."""
+        found = {}
+        if not text or not self._patterns:
+            return found
+        text = text.lower()
+        goto, fail, out, patterns = self._goto, self._fail, self._out, self._patterns
+        whole_word = self.whole_word
+        state = 0
+        for pos, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if not out[state]:
+                continue
+            for pid in out[state]:
+                length, targets = patterns[pid]
+                if whole_word:
+                    start = pos - length + 1
+                    if start > 0 and _is_word_char(text[start - 1]):
+                        continue
+                    if pos + 1 < len(text) and _is_word_char(text[pos + 1]):
+                        continue
+                for ci, gi in targets:
+                    found.setdefault(ci, set()).add(gi)
+        return found
+
+
+def get_keyword_matcher(cfgs, whole_word=False):
+    """Return a cached KeywordMatcher for cfgs, compiling it only when the keyword set changed."""
+    key = (keyword_fingerprint(cfgs), bool(whole_word))
+    matcher = _MATCHER_CACHE.get(key)
+    if matcher is not None:
+        _MATCHER_CACHE.move_to_end(key)
+        return matcher
+    matcher = KeywordMatcher(cfgs, whole_word=whole_word)
+    _MATCHER_CACHE[key] = matcher
+    while len(_MATCHER_CACHE) > _MATCHER_CACHE_SIZE:
+        _MATCHER_CACHE.popitem(last=False)
+    return matcher
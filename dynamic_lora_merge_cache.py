@@ -0,0 +1,209 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import weakref
+import folder_paths
+from .dynamic_lora_metrics import CacheCounters, env_int, logger
+from .dynamic_lora_patcher import LoRAAdapter, _low_rank
+
+DEFAULT_BUDGET_BYTES = 8 * 1024 ** 3
+# Temp files of writes that died halfway are removed once they are this old
+STALE_TMP_SECONDS = 3600
+
+_MODEL_HASHES = weakref.WeakKeyDictionary()
+
+
+def _module_hash(module):
+    """Cheap fingerprint of a torch module: class, key names, shapes and a few sampled values."""
+    try:
+        return _MODEL_HASHES[module]
+    except (KeyError, TypeError):
+        pass
+    h = hashlib.sha256(type(module).__name__.encode("utf-8"))
+    sd = module.state_dict()
+    keys = sorted(sd)
+    for k in keys:
+        h.update(f"{k}:{tuple(sd[k].shape)}:{sd[k].dtype}".encode("utf-8"))
+    step = max(1, len(keys) // 16)
+    for k in keys[::step]:
+        sample = sd[k].flatten()[:32].float().cpu().tolist()
+        h.update(json.dumps(sample).encode("utf-8"))
+    digest = h.hexdigest()
+    try:
+        _MODEL_HASHES[module] = digest
+    except TypeError:
+        pass
+    return digest
+
+
+def base_hash(model, clip):
+    """Fingerprint of the base MODEL/CLIP weights a merged patch set was built against."""
+    parts = [
+        _module_hash(model.model) if model is not None else "-",
+        _module_hash(clip.cond_stage_model) if clip is not None else "-",
+    ]
+    return "+".join(parts)
+
+
+def merge_key(model, clip, specs):
+    """Content address of a merged patch set: base weights plus every (file, strength, blocks, targets)."""
+    h = hashlib.sha256(base_hash(model, clip).encode("ascii"))
+    h.update(json.dumps(specs, sort_keys=True, default=str).encode("utf-8"))
+    return h.hexdigest()
+
+
+def _key_to_json(key):
+    return list(_key_to_json(k) for k in key) if isinstance(key, tuple) else key
+
+
+def _key_from_json(key):
+    return tuple(_key_from_json(k) for k in key) if isinstance(key, list) else key
+
+
+def _make_patch(up, down, alpha):
+    if LoRAAdapter is not None:
+        return LoRAAdapter(set(), (up, down, alpha, None, None, None))
+    return ("lora", (up, down, alpha, None, None))
+
+
+class MergeCache(CacheCounters):
+    """Opt-in, content-addressed disk cache of fused LoRA patch sets, LRU-evicted within a byte budget."""
+
+    def __init__(self, directory=None, budget_bytes=None):
+        self.directory = directory or os.environ.get("DYNAMIC_LORA_MERGE_CACHE_DIR") or self._default_dir()
+        self.budget_bytes = (env_int("DYNAMIC_LORA_MERGE_CACHE_BYTES", DEFAULT_BUDGET_BYTES)
+                             if budget_bytes is None else int(budget_bytes))
+        self._lock = threading.Lock()
+        self.stores = 0
+        self.bytes_saved = 0
+
+    @staticmethod
+    def _default_dir():
+        try:
+            base = folder_paths.get_user_directory()
+        except Exception:
+            base = os.path.dirname(os.path.abspath(__file__))
+        return os.path.join(base, "dynamic_lora_merge_cache")
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".safetensors")
+
+    def load(self, key, source_bytes=0):
+        """Cached [(strength, patches), ...] passes for key, or None.
+        source_bytes is what reading the individual LoRAs would have cost."""
+        path = self._path(key)
+        if not os.path.exists(path):
+            with self._lock:
+                self.misses += 1
+            return None
+        from safetensors import safe_open
+        try:
+            with safe_open(path, framework="pt", device="cpu") as f:
+                layout = json.loads(f.metadata()["layout"])
+                passes = []
+                for i, p in enumerate(layout):
+                    patches = {}
+                    for j, (key_json, alpha) in enumerate(p["keys"]):
+                        patches[_key_from_json(key_json)] = _make_patch(
+                            f.get_tensor(f"{i}.{j}.up"), f.get_tensor(f"{i}.{j}.down"), alpha)
+                    passes.append((p["strength"], patches))
+            os.utime(path)  # LRU order follows mtime
+        except Exception as e:
+            logger.warning(f"[DynamicLoraLoader] Dropping unreadable merge cache entry {path}: {e}")
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+            self.bytes_saved += max(0, source_bytes - os.path.getsize(path))
+        return passes
+
+    def store(self, key, passes):
+        """Write passes under key. Returns False if they contain patches other than plain LoRA."""
+        tensors = {}
+        layout = []
+        for i, (strength, patches) in enumerate(passes):
+            keys = []
+            for j, (k, patch) in enumerate(patches.items()):
+                lr = _low_rank(patch)
+                if lr is None:
+                    return False
+                up, down, alpha = lr
+                tensors[f"{i}.{j}.up"] = up.contiguous()
+                tensors[f"{i}.{j}.down"] = down.contiguous()
+                keys.append([_key_to_json(k), None if alpha is None else float(alpha)])
+            layout.append({"strength": strength, "keys": keys})
+        from safetensors.torch import save_file
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        # Several threads or processes may store the same key at once
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            save_file(tensors, tmp, metadata={"layout": json.dumps(layout)})
+            os.replace(tmp, path)
+        except Exception:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+        with self._lock:
+            self.stores += 1
+        self._evict()
+        return True
+
+    def _evict(self):
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        files = [os.path.join(self.directory, n) for n in names if n.endswith(".safetensors")]
+        stale = time.time() - STALE_TMP_SECONDS
+        for n in names:
+            if n.endswith(".tmp"):
+                try:
+                    if os.path.getmtime(os.path.join(self.directory, n)) < stale:
+                        os.remove(os.path.join(self.directory, n))
+                except OSError:
+                    pass
+        entries = []
+        for path in files:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.budget_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            with self._lock:
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return self.counter_stats(stores=self.stores, bytes_saved=self.bytes_saved,
+                                      budget_bytes=self.budget_bytes)
+
+
+_MERGE_CACHE = None
+
+
+def merge_cache():
+    """The shared merge cache."""
+    global _MERGE_CACHE
+    if _MERGE_CACHE is None:
+        _MERGE_CACHE = MergeCache()
+    return _MERGE_CACHE
@@ -0,0 +1,167 @@
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger("DynamicLoraLoader")
+
+# Stages a run is timed in, so traces and /stats always use the same names
+STAGES = ("randomizer", "embedding", "matching", "combo_resolution", "file_io", "patching", "encoding")
+
+
+def env_int(name, default):
+    """Integer setting from the environment, default when unset or not an integer."""
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+class CacheCounters:
+    """Hit/miss/eviction counters of a cache and their part of its stats()."""
+
+    hits = 0
+    misses = 0
+    evictions = 0
+
+    def counter_stats(self, **extra):
+        lookups = self.hits + self.misses
+        return dict(extra, hits=self.hits, misses=self.misses,
+                    hit_rate=self.hits / lookups if lookups else 0.0, evictions=self.evictions)
+
+
+class RunTrace:
+    """Wall time per stage, counters and free-form notes (e.g. the plan optimizer report) for one loader run."""
+
+    def __init__(self, node):
+        self.node = node
+        self.started = time.time()
+        self.stages = {}
+        self.counts = {}
+        self.notes = {}
+
+    def add_time(self, stage, seconds):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def count(self, name, n=1):
+        self.counts[name] = self.counts.get(name, 0) + n
+
+    def note(self, name, value):
+        """Attach a JSON-serializable value; notes of the same name from one run are collected in a list."""
+        self.notes.setdefault(name, []).append(value)
+
+    def to_dict(self):
+        d = {
+            "node": self.node,
+            "started": self.started,
+            "total_ms": round((time.time() - self.started) * 1000.0, 3),
+            "stages_ms": {k: round(v * 1000.0, 3) for k, v in self.stages.items()},
+            "counts": dict(self.counts),
+        }
+        if self.notes:
+            d["notes"] = {k: list(v) for k, v in self.notes.items()}
+        return d
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), sort_keys=True)
+
+
+class LoaderMetrics:
+    """Process-wide aggregates of every RunTrace plus the trace of the last run."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.runs = 0
+            self.stage_seconds = {}
+            self.stage_calls = {}
+            self.counts = {}
+            self.last_trace = None
+
+    @contextmanager
+    def run(self, node="DynamicLoraLoader"):
+        """Collect stage timings and counts recorded on this thread into a new RunTrace."""
+        trace = RunTrace(node)
+        previous = getattr(self._local, "trace", None)
+        self._local.trace = trace
+        try:
+            yield trace
+        finally:
+            self._local.trace = previous
+            with self._lock:
+                self.runs += 1
+                self.last_trace = trace.to_dict()
+                for name, n in trace.counts.items():
+                    self.counts[name] = self.counts.get(name, 0) + n
+            logger.debug(f"[{node}] {trace.to_json()}")
+
+    @contextmanager
+    def stage(self, name):
+        """Time a stage of the current run (and the process-wide totals); name is one of STAGES."""
+        if name not in STAGES:
+            raise ValueError(f"Unknown loader stage {name!r}, expected one of {STAGES}")
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            trace = getattr(self._local, "trace", None)
+            if trace is not None:
+                trace.add_time(name, elapsed)
+            with self._lock:
+                self.stage_seconds[name] = self.stage_seconds.get(name, 0.0) + elapsed
+                self.stage_calls[name] = self.stage_calls.get(name, 0) + 1
+
+    def count(self, name, n=1):
+        """Bump a counter of the current run; counters outside a run are dropped."""
+        trace = getattr(self._local, "trace", None)
+        if trace is not None:
+            trace.count(name, n)
+
+    def note(self, name, value):
+        """Attach a note to the current run; notes outside a run are dropped."""
+        trace = getattr(self._local, "trace", None)
+        if trace is not None:
+            trace.note(name, value)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "runs": self.runs,
+                "stages_ms": {k: round(v * 1000.0, 3) for k, v in self.stage_seconds.items()},
+                "stage_calls": dict(self.stage_calls),
+                "counts": dict(self.counts),
+                "last_trace": self.last_trace,
+            }
+
+
+_METRICS = LoaderMetrics()
+
+
+def metrics():
+    """The shared loader metrics."""
+    return _METRICS
+
+
+def get_stats():
+    """Scrapeable snapshot of loader metrics and cache statistics."""
+    from .dynamic_lora_cache import lora_cache
+    from .dynamic_lora_conditioning import conditioning_cache
+    from .dynamic_lora_merge_cache import merge_cache
+    from .dynamic_lora_prefetch import prefetcher
+    from .dynamic_lora_shm import shared_store
+    stats = metrics().stats()
+    stats["lora_cache"] = lora_cache().stats()
+    stats["merge_cache"] = merge_cache().stats()
+    stats["conditioning_cache"] = conditioning_cache().stats()
+    stats["prefetch"] = prefetcher().stats()
+    store = shared_store()
+    if store is not None:
+        stats["shared_store"] = store.stats()
+    return stats
@@ -0,0 +1,278 @@
+import uuid
+import weakref
+from collections import namedtuple
+import comfy.lora
+from .dynamic_lora_blocks import model_block_index, scale_by_block
+from .dynamic_lora_header_index import model_arch
+
+try:
+    from comfy.lora_convert import convert_lora
+except ImportError:
+    convert_lora = None
+
+try:
+    from comfy.weight_adapter.lora import LoRAAdapter
+except ImportError:
+    LoRAAdapter = None
+
+# One LoRA to apply: key identifies it across runs (file + occurrence),
+# block_weights is a tuple of (block name, weight) pairs
+LoraApplication = namedtuple("LoraApplication", ["key", "lora", "strength", "patch_model", "patch_clip", "block_weights"])
+
+_UNET_KEY_MAPS = weakref.WeakKeyDictionary()
+_CLIP_KEY_MAPS = weakref.WeakKeyDictionary()
+_BLOCK_INDEXES = weakref.WeakKeyDictionary()
+
+
+def _cached_key_map(cache, owner, build):
+    try:
+        km = cache.get(owner)
+    except TypeError:
+        return build(owner, {})
+    if km is None:
+        km = build(owner, {})
+        cache[owner] = km
+    return km
+
+
+def build_key_map(model, clip):
+    """LoRA key -> model key map for MODEL and CLIP, cached per underlying module."""
+    key_map = {}
+    if model is not None:
+        key_map.update(_cached_key_map(_UNET_KEY_MAPS, model.model, comfy.lora.model_lora_keys_unet))
+    if clip is not None:
+        key_map.update(_cached_key_map(_CLIP_KEY_MAPS, clip.cond_stage_model, comfy.lora.model_lora_keys_clip))
+    return key_map
+
+
+def block_index(model):
+    """Model weight key -> block name for MODEL, cached per underlying module."""
+    if model is None:
+        return {}
+    arch = model_arch(model)
+    return _cached_key_map(_BLOCK_INDEXES, model.model,
+                           lambda m, _: model_block_index(comfy.lora.model_lora_keys_unet(m, {}), arch))
+
+
+def load_patches(lora, key_map):
+    """Convert a LoRA state dict into ComfyUI patches keyed by model weight."""
+    if convert_lora is not None:
+        lora = convert_lora(lora)
+    return comfy.lora.load_lora(lora, key_map)
+
+
+def _low_rank(patch):
+    """(up, down, alpha) for a plain LoRA patch, None for anything else (LoCon, LoHa, DoRA, diff...)."""
+    if LoRAAdapter is not None and isinstance(patch, LoRAAdapter):
+        weights = patch.weights
+    elif isinstance(patch, tuple) and len(patch) == 2 and patch[0] == "lora":
+        weights = patch[1]
+    else:
+        return None
+    up, down, alpha, mid = weights[:4]
+    extra = weights[4:]
+    if mid is not None or any(e is not None for e in extra):
+        return None
+    return up, down, alpha
+
+
+def _fuse(contributions):
+    """Concatenate the low-rank factors of several plain LoRA patches into one.
+    Returns None when the patches can't be fused."""
+    factors = []
+    for patch, strength in contributions:
+        lr = _low_rank(patch)
+        if lr is None:
+            return None
+        factors.append((lr, strength))
+
+    (up0, down0, _), _ = factors[0]
+    ups, downs = [], []
+    for (up, down, alpha), strength in factors:
+        if up.shape[0] != up0.shape[0] or down.shape[1:] != down0.shape[1:] or up.shape[2:] != up0.shape[2:]:
+            return None
+        rank = down.shape[0]
+        scale = strength * (float(alpha) / rank if alpha is not None else 1.0)
+        ups.append((up.float() * scale).to(up0.dtype))
+        downs.append(down.to(down0.dtype))
+
+    import torch
+    up = torch.cat(ups, dim=1)
+    down = torch.cat(downs, dim=0)
+    # alpha == rank so the fused update is applied unscaled
+    rank = float(down.shape[0])
+    if isinstance(contributions[0][0], tuple):
+        return ("lora", (up, down, rank, None, None))
+    return LoRAAdapter(set(), (up, down, rank, None, None, None))
+
+
+def _passes(by_key):
+    """{key: [(patch, strength), ...]} -> list of (strength, patches) passes, fusing where possible."""
+    passes = []
+
+    def add(strength, key, patch):
+        for s, bucket in passes:
+            if s == strength and key not in bucket:
+                bucket[key] = patch
+                return
+        passes.append((strength, {key: patch}))
+
+    for key, contributions in by_key.items():
+        if len(contributions) > 1:
+            fused = _fuse(contributions)
+            if fused is not None:
+                add(1.0, key, fused)
+                continue
+        for patch, strength in contributions:
+            add(strength, key, patch)
+    return passes
+
+
+def fuse_patch_sets(patch_sets):
+    """Merge [(patches, strength), ...] into a list of (strength, patches) passes.
+    Keys touched by several plain LoRAs get one fused patch applied at strength 1.0."""
+    by_key = {}
+    for patches, strength in patch_sets:
+        for key, patch in patches.items():
+            by_key.setdefault(key, []).append((patch, strength))
+    return _passes(by_key)
+
+
+def _inner_patcher(obj):
+    # CLIP wraps its ModelPatcher, MODEL is one
+    return getattr(obj, "patcher", obj)
+
+
+def _remove_patches(obj, inserted, keys):
+    """Drop the patches we added for keys from a cloned MODEL/CLIP, leaving any others intact."""
+    patcher = _inner_patcher(obj)
+    patches = getattr(patcher, "patches", None)
+    if patches is None:
+        return
+    for key in keys:
+        # add_patches files (weight key, offset) patches, e.g. of fused qkv weights, under the weight key
+        name = key[0] if isinstance(key, tuple) else key
+        ours = inserted.get(key)
+        current = patches.get(name)
+        if not ours or current is None:
+            continue
+        ids = {id(p) for p, _ in ours}
+        kept = [p for p in current if id(p[1]) not in ids]
+        if kept:
+            patches[name] = kept
+        else:
+            del patches[name]
+    patcher.patches_uuid = uuid.uuid4()
+
+
+class PatchState:
+    """LoRA patches applied on top of one base MODEL/CLIP pair.
+    update() diffs a new set of applications against the current one and only touches
+    the weight keys of LoRAs that were added, removed or rescaled."""
+
+    def __init__(self, model, clip):
+        self.base_model = model
+        self.base_clip = clip
+        self.model = model
+        self.clip = clip
+        self.applied = {}        # application key -> ((strength, block_weights), [(patches, strength), ...])
+        self.contributions = {}  # weight key -> {application key: [(patch, strength), ...]}
+        self.inserted = {}       # weight key -> [(patch, strength), ...] we added to self.model/self.clip
+
+    def matches(self, model, clip):
+        return self.base_model is model and self.base_clip is clip
+
+    def update(self, loras):
+        """Bring the patched MODEL/CLIP in line with a list of LoraApplication and return them."""
+        model, clip = self.base_model, self.base_clip
+        loras = {l.key: l for l in loras
+                 if l.strength != 0 and ((l.patch_model and model is not None) or (l.patch_clip and clip is not None))}
+        removed = [k for k in self.applied if k not in loras]
+        changed = [k for k, l in loras.items()
+                   if k not in self.applied or self.applied[k][0] != (l.strength, l.block_weights)]
+        if not removed and not changed:
+            return self.model, self.clip
+
+        if not loras:
+            self.__init__(model, clip)
+            return model, clip
+
+        affected = set()
+        for k in removed + [k for k in changed if k in self.applied]:
+            for patches, _ in self.applied.pop(k)[1]:
+                for key in patches:
+                    affected.add(key)
+                    self.contributions[key].pop(k, None)
+
+        need_model = model is not None and any(l.patch_model for l in loras.values())
+        need_clip = clip is not None and any(l.patch_clip for l in loras.values())
+        key_map = build_key_map(model if need_model else None, clip if need_clip else None)
+        blocks = block_index(model) if need_model else {}
+        for k in changed:
+            l = loras[k]
+            sets = scale_by_block(load_patches(l.lora, key_map), l.strength, l.block_weights, blocks)
+            self.applied[k] = ((l.strength, l.block_weights), sets)
+            for patches, strength in sets:
+                for key, patch in patches.items():
+                    affected.add(key)
+                    self.contributions.setdefault(key, {}).setdefault(k, []).append((patch, strength))
+
+        by_key = {}
+        for key in affected:
+            per_app = self.contributions.get(key)
+            if not per_app:
+                self.contributions.pop(key, None)
+                continue
+            by_key[key] = [c for k in per_app for c in per_app[k]]
+
+        new_model = self.model.clone() if need_model or self.model is not model else self.model
+        new_clip = self.clip.clone() if need_clip or self.clip is not clip else self.clip
+        for obj, base in ((new_model, model), (new_clip, clip)):
+            if obj is not base:
+                _remove_patches(obj, self.inserted, affected)
+        for key in affected:
+            self.inserted.pop(key, None)
+
+        for strength, patches in _passes(by_key):
+            if new_model is not model:
+                new_model.add_patches(patches, strength)
+            if new_clip is not clip:
+                new_clip.add_patches(patches, strength)
+            for key, patch in patches.items():
+                self.inserted.setdefault(key, []).append((patch, strength))
+
+        self.model, self.clip = new_model, new_clip
+        return new_model, new_clip
+
+
+    def current_passes(self):
+        """Every patch this state added, as [(strength, patches), ...] passes."""
+        by_strength = {}
+        for key, added in self.inserted.items():
+            for patch, strength in added:
+                passes = by_strength.setdefault(strength, [])
+                for bucket in passes:
+                    if key not in bucket:
+                        bucket[key] = patch
+                        break
+                else:
+                    passes.append({key: patch})
+        return [(s, bucket) for s, buckets in by_strength.items() for bucket in buckets]
+
+
+def add_passes(model, clip, passes, patch_model=True, patch_clip=True):
+    """Clone MODEL/CLIP once and add prebuilt [(strength, patches), ...] passes."""
+    new_model = model.clone() if model is not None and patch_model else model
+    new_clip = clip.clone() if clip is not None and patch_clip else clip
+    for strength, patches in passes:
+        if new_model is not model:
+            new_model.add_patches(patches, strength)
+        if new_clip is not clip:
+            new_clip.add_patches(patches, strength)
+    return new_model, new_clip
+
+
+def apply_loras(model, clip, loras):
+    """Apply a list of LoraApplication with at most one clone of MODEL and CLIP.
+    A patcher is only cloned when some LoRA targets it."""
+    return PatchState(model, clip).update(loras)
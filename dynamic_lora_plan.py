@@ -0,0 +1,145 @@
+import hashlib
+import json
+from collections import OrderedDict, namedtuple
+
+BLOCK_WEIGHT_ORDER = ["IN00_fine_texture","IN01_low_level_edges","IN02_detail_refinement","MID_global_structure",
+                      "OUT00_object_features","OUT01_mid_level_semantics","OUT02_higher_semantics","OUT03_composition",
+                      "OUT04_style_refinement","OUT05_global_meaning","OUT06_late_abstraction","OUT07_final_pass"]
+
+# One LoRA application: block_weights is a tuple of (block name, weight) in BLOCK_WEIGHT_ORDER
+PlanEntry = namedtuple("PlanEntry", ["id", "path", "strength", "block_weights", "combo_group"])
+
+# Deterministic result of prompt/keyword/offset/combo resolution; report is the PlanReport of optimize_plan
+LoraPlan = namedtuple("LoraPlan", ["entries", "pos_prompt", "neg_prompt", "report"], defaults=(None,))
+
+# What optimize_plan eliminated: merged is ((path, (ids...)), ...), pruned is ((id, strength), ...)
+PlanReport = namedtuple("PlanReport", ["applications_in", "applications_out", "merged", "pruned"])
+
+DEFAULT_STRENGTH_EPSILON = 1e-4
+
+_PLAN_CACHE = OrderedDict()
+_PLAN_CACHE_SIZE = 256
+
+
+def ordered_block_weights(bw):
+    """Block weights dict -> tuple of (name, weight) pairs in BLOCK_WEIGHT_ORDER."""
+    out = []
+    for k in BLOCK_WEIGHT_ORDER:
+        if k in (bw or {}):
+            try:
+                out.append((k, float(bw[k])))
+            except (TypeError, ValueError):
+                out.append((k, bw[k]))
+    return tuple(out)
+
+
+def lora_tag(entry):
+    """<lora:path:strength[:w1,w2,...]> prompt tag for a plan entry."""
+    bw_list = [str(v) for _, v in entry.block_weights]
+    return f"<lora:{entry.path}:{entry.strength}" + (":" + ",".join(bw_list) if bw_list else "") + ">"
+
+
+def _block_weight(entry, name):
+    # Same rule as scale_by_block: missing or non-numeric weights leave the block at full strength
+    for k, w in entry.block_weights:
+        if k == name:
+            return float(w) if isinstance(w, (int, float)) else 1.0
+    return 1.0
+
+
+def _merge_entries(entries):
+    """One entry applying the same file as all of entries, or None when they can't be folded into one.
+    Patches are linear in strength, so a block ends up at sum(strength * weight) / sum(strength)."""
+    strength = sum(e.strength for e in entries)
+    first = entries[0]
+    merged_id = "+".join(e.id for e in entries)
+    if not any(e.block_weights for e in entries):
+        return first._replace(id=merged_id, strength=strength)
+    if strength == 0:
+        return None
+    names = [k for k in BLOCK_WEIGHT_ORDER if any(n == k for e in entries for n, _ in e.block_weights)]
+    weights = tuple((k, sum(e.strength * _block_weight(e, k) for e in entries) / strength) for k in names)
+    if all(w == 1.0 for _, w in weights):
+        weights = ()
+    return first._replace(id=merged_id, strength=strength, block_weights=weights)
+
+
+def optimize_plan(entries, epsilon=DEFAULT_STRENGTH_EPSILON):
+    """Rewrite plan entries into the fewest LoRA applications with the same result.
+    Entries of the same file are merged into one application with their combined strength and
+    block weights, applications weaker than epsilon are dropped, and the rest are sorted by path
+    so equal sets of LoRAs give identical entries (and cache keys) whatever the config order.
+    Returns (entries, PlanReport)."""
+    by_path = OrderedDict()
+    for e in entries:
+        by_path.setdefault(e.path, []).append(e)
+
+    merged = []
+    out = []
+    for path, group in by_path.items():
+        combined = _merge_entries(group) if len(group) > 1 else group[0]
+        if combined is None:
+            out.extend(group)
+            continue
+        if len(group) > 1:
+            merged.append((path, tuple(e.id for e in group)))
+        out.append(combined)
+
+    def keep(e):
+        return e.path and e.strength != 0 and abs(e.strength) >= epsilon
+
+    pruned = tuple((e.id, e.strength) for e in out if not keep(e))
+    out = sorted((e for e in out if keep(e)), key=lambda e: (e.path, e.id))
+    return tuple(out), PlanReport(len(entries), len(out), tuple(merged), pruned)
+
+
+def config_fingerprint(config):
+    """Content hash of a config (precomputed for LoraConfig records)."""
+    fingerprint = getattr(config, "content_hash", None)
+    if fingerprint is not None:
+        return fingerprint
+    data = json.dumps(config, sort_keys=True, default=str)
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+
+def report_dict(report):
+    """JSON-friendly form of a PlanReport for run traces."""
+    return {
+        "applications_in": report.applications_in,
+        "applications_out": report.applications_out,
+        "merged": [{"path": path, "ids": list(ids)} for path, ids in report.merged],
+        "pruned": [{"id": i, "strength": s} for i, s in report.pruned],
+    }
+
+
+def configs_fingerprint(cfgs):
+    """Hash of the fingerprints of every config (order sensitive)."""
+    h = hashlib.sha1()
+    for c in cfgs:
+        h.update(config_fingerprint(c).encode("ascii"))
+    return h.hexdigest()
+
+
+def plan_key(*parts, cfgs=(), fingerprint=None):
+    """Hash of the plan inputs (prompts, seed, options) plus the fingerprint of the configs,
+    which callers that resolve many plans against the same configs can pass precomputed."""
+    h = hashlib.sha1()
+    for part in parts:
+        h.update(json.dumps(part, sort_keys=True, default=str).encode("utf-8"))
+        h.update(b"\0")
+    h.update((fingerprint or configs_fingerprint(cfgs)).encode("ascii"))
+    return h.hexdigest()
+
+
+def get_cached_plan(key):
+    plan = _PLAN_CACHE.get(key)
+    if plan is not None:
+        _PLAN_CACHE.move_to_end(key)
+    return plan
+
+
+def cache_plan(key, plan):
+    _PLAN_CACHE[key] = plan
+    while len(_PLAN_CACHE) > _PLAN_CACHE_SIZE:
+        _PLAN_CACHE.popitem(last=False)
+    return plan
@@ -0,0 +1,95 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from .dynamic_lora_cache import filtered_state_dict, lora_cache
+from .dynamic_lora_metrics import env_int, logger
+
+DEFAULT_WORKERS = 4
+
+
+class LoraPrefetcher:
+    """Thread pool that reads LoRA tensors into the shared cache ahead of patching.
+    Workers only fill the cache, so they never touch MODEL/CLIP objects owned by the executor thread."""
+
+    def __init__(self, max_workers=None, on_config=None):
+        self.max_workers = env_int("DYNAMIC_LORA_PREFETCH_WORKERS", DEFAULT_WORKERS) if max_workers is None else max_workers
+        self.on_config = (os.environ.get("DYNAMIC_LORA_PREFETCH_ON_CONFIG", "0") == "1") if on_config is None else on_config
+        self._pool = None
+        self._pending = {}  # full path -> future
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+
+    def configure(self, max_workers=None, on_config=None):
+        """Change the concurrency limit (0 disables prefetching) or config-time prefetching."""
+        with self._lock:
+            if max_workers is not None and max_workers != self.max_workers:
+                self.max_workers = max_workers
+                if self._pool is not None:
+                    self._pool.shutdown(wait=False)
+                    self._pool = None
+            if on_config is not None:
+                self.on_config = on_config
+
+    def _executor(self):
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="DynamicLoraPrefetch")
+        return self._pool
+
+    @staticmethod
+    def _read(full, keep):
+        sd = filtered_state_dict(lora_cache().get(full), keep)
+        # Touch every tensor we'll need so lazily mapped files are actually read now
+        for k in sd:
+            sd[k]
+        return full
+
+    def prefetch(self, files):
+        """Start reading [(full_path, key filter or None), ...] in the background."""
+        if self.max_workers <= 0:
+            return
+        submitted = []
+        with self._lock:
+            pool = self._executor()
+            for full, keep in files:
+                future = self._pending.get(full)
+                if future is not None and not future.done():
+                    continue
+                future = self._pending[full] = pool.submit(self._read, full, keep)
+                submitted.append(future)
+                self.submitted += 1
+        # Callbacks of already finished futures run right here, so add them outside the lock
+        for future in submitted:
+            future.add_done_callback(self._done)
+
+    def _done(self, future):
+        error = future.exception()
+        with self._lock:
+            for full, f in list(self._pending.items()):
+                if f is future:
+                    del self._pending[full]
+            if error is None:
+                self.completed += 1
+            else:
+                self.failed += 1
+        if error is not None:
+            logger.warning(f"[DynamicLoraLoader] Prefetch failed: {error}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "pending": len(self._pending),
+            }
+
+
+_PREFETCHER = LoraPrefetcher()
+
+
+def prefetcher():
+    """The shared LoRA prefetcher."""
+    return _PREFETCHER
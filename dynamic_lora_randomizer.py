@@ -0,0 +1,161 @@
+import bisect
+import itertools
+import random
+import re
+from functools import lru_cache
+
+_WEIGHT_RE = re.compile(r'^\s*(\d+(?:\.\d*)?|\.\d+)\s*\*')
+
+
+class _Choice:
+    """{a:b:c} group - options are (weight, parts) with nested groups allowed inside parts."""
+    __slots__ = ("options", "cumulative", "weighted")
+
+    def __init__(self, options):
+        self.options = [parts for _, parts in options]
+        weights = [w for w, _ in options]
+        self.weighted = any(w != 1.0 for w in weights)
+        self.cumulative = list(itertools.accumulate(weights))
+
+
+def _parse_group(text, i):
+    """Parse a group starting after its '{'. Returns (node, end) or None if it's not a group."""
+    options = []
+    parts, buf = [], []
+    n = len(text)
+    while i < n:
+        ch = text[i]
+        if ch == "{":
+            nested = _parse_group(text, i + 1)
+            if nested is None:
+                return None
+            if buf:
+                parts.append("".join(buf))
+                buf = []
+            if nested[0] is not None:
+                parts.append(nested[0])
+            i = nested[1]
+            continue
+        if ch == ":" or ch == "}":
+            if buf:
+                parts.append("".join(buf))
+                buf = []
+            options.append(parts)
+            parts = []
+            i += 1
+            if ch == "}":
+                if len(options) == 1 and not options[0]:
+                    # "{}" stays literal text
+                    return "{}", i
+                return _make_choice(options), i
+            continue
+        buf.append(ch)
+        i += 1
+    return None
+
+
+def _make_choice(raw_options):
+    options = []
+    for parts in raw_options:
+        parts = list(parts)
+        weight = 1.0
+        if parts and isinstance(parts[0], str):
+            m = _WEIGHT_RE.match(parts[0])
+            if m:
+                weight = float(m.group(1))
+                parts[0] = parts[0][m.end():]
+        # Options are trimmed and empty ones dropped
+        if parts and isinstance(parts[0], str):
+            parts[0] = parts[0].lstrip()
+        if parts and isinstance(parts[-1], str):
+            parts[-1] = parts[-1].rstrip()
+        parts = [p for p in parts if p != ""]
+        if parts and weight > 0:
+            options.append((weight, parts))
+    return _Choice(options) if options else None
+
+
+def _parse(text):
+    parts, buf = [], []
+    i, n = 0, len(text)
+    while i < n:
+        ch = text[i]
+        if ch == "{":
+            group = _parse_group(text, i + 1)
+            if group is not None:
+                if buf:
+                    parts.append("".join(buf))
+                    buf = []
+                if group[0] is not None:
+                    parts.append(group[0])
+                i = group[1]
+                continue
+        buf.append(ch)
+        i += 1
+    if buf:
+        parts.append("".join(buf))
+    return parts
+
+
+def _render(parts, rng, out):
+    for p in parts:
+        if p.__class__ is str:
+            out.append(p)
+            continue
+        if p.weighted:
+            idx = bisect.bisect_right(p.cumulative, rng.random() * p.cumulative[-1])
+            idx = min(idx, len(p.options) - 1)
+        else:
+            idx = int(rng.random() * len(p.options))
+        _render(p.options[idx], rng, out)
+
+
+def _variants(parts):
+    pools = []
+    for p in parts:
+        if p.__class__ is str:
+            pools.append((p,))
+        else:
+            seen = {}
+            for option in p.options:
+                for v in _variants(option):
+                    seen.setdefault(v, None)
+            pools.append(tuple(seen))
+    for combo in itertools.product(*pools):
+        yield "".join(combo)
+
+
+class RandomizerTemplate:
+    """Parsed form of a prompt with {a:b:c} randomizer codes.
+    Groups may be nested ({a:{b:c}}) and options weighted with a leading factor ({3*a:b})."""
+
+    def __init__(self, text):
+        self.text = text or ""
+        self.parts = _parse(self.text)
+        self.has_choices = any(p.__class__ is not str for p in self.parts)
+
+    def render(self, rng=random):
+        """One variant, drawing from rng (a random.Random or the random module)."""
+        if not self.has_choices:
+            return self.text
+        out = []
+        _render(self.parts, rng, out)
+        return "".join(out)
+
+    def expand(self, n, seed=None):
+        """n variants from a Random seeded with seed (unseeded when None)."""
+        rng = random.Random(seed)
+        return [self.render(rng) for _ in range(n)]
+
+    def enumerate_all(self, limit=None):
+        """Iterate every distinct combination of options, optionally stopping after limit."""
+        variants = _variants(self.parts)
+        if limit is not None:
+            variants = itertools.islice(variants, limit)
+        return variants
+
+
+@lru_cache(maxsize=1024)
+def compile_template(text):
+    """Cached RandomizerTemplate for text."""
+    return RandomizerTemplate(text)
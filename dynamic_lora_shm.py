@@ -0,0 +1,263 @@
+import atexit
+import hashlib
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+import weakref
+from collections import deque
+from contextlib import contextmanager
+from .dynamic_lora_metrics import CacheCounters, env_int, logger
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+DEFAULT_BUDGET_BYTES = 8 * 1024 ** 3
+INDEX_FILENAME = "index.json"
+LOCK_FILENAME = "index.lock"
+_ALIGN = 64
+
+
+def _default_dir():
+    base = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(base, "dynamic_lora_store")
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def write_tensor_file(path, sd):
+    """Write a {name: tensor} dict as one flat file: 8-byte header length, JSON header, aligned raw data.
+    Returns the file size, or None when sd holds something other than tensors."""
+    import torch
+    tensors = {}
+    offset = 0
+    for name, t in sd.items():
+        if not isinstance(t, torch.Tensor):
+            return None
+        t = t.detach().to("cpu").contiguous()
+        nbytes = t.numel() * t.element_size()
+        tensors[name] = (t, str(t.dtype).replace("torch.", ""), list(t.shape), offset, nbytes)
+        offset += -(-nbytes // _ALIGN) * _ALIGN
+    header = json.dumps({n: [d, s, o, b] for n, (_, d, s, o, b) in tensors.items()}).encode("utf-8")
+    data_start = -(-(8 + len(header)) // _ALIGN) * _ALIGN
+    with open(path, "wb") as f:
+        f.write(struct.pack("<Q", len(header)))
+        f.write(header)
+        for t, _, _, o, nbytes in tensors.values():
+            if nbytes:
+                f.seek(data_start + o)
+                f.write(t.reshape(-1).view(torch.uint8).numpy().data)
+        f.truncate(data_start + offset)
+    return data_start + offset
+
+
+def map_tensor_file(path):
+    """{name: tensor} backed directly by a private mapping of path (pages are shared until written).
+    Returns (state dict, mmap); the tensors keep the mapping alive."""
+    import torch
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    (length,) = struct.unpack("<Q", mm[:8])
+    header = json.loads(mm[8:8 + length])
+    data_start = -(-(8 + length) // _ALIGN) * _ALIGN
+    sd = {}
+    for name, (dtype, shape, offset, nbytes) in header.items():
+        dtype = getattr(torch, dtype)
+        if nbytes == 0:
+            sd[name] = torch.empty(shape, dtype=dtype)
+            continue
+        count = nbytes // torch.empty((), dtype=dtype).element_size()
+        sd[name] = torch.frombuffer(mm, dtype=dtype, count=count, offset=data_start + offset).reshape(shape)
+    return sd, mm
+
+
+class SharedLoraStore(CacheCounters):
+    """LoRA tensors deserialized once per host and mapped zero-copy by every ComfyUI process.
+    Each LoRA is a flat tensor file in a shared directory (tmpfs by default) listed in a JSON index.
+    The index is only touched under an fcntl lock and tracks, per entry, which processes have it
+    mapped; entries nobody maps are evicted least recently used first once the byte budget is exceeded."""
+
+    def __init__(self, directory=None, budget_bytes=None):
+        self.directory = directory or _default_dir()
+        self.budget_bytes = (env_int("DYNAMIC_LORA_SHARED_STORE_BYTES", DEFAULT_BUDGET_BYTES)
+                             if budget_bytes is None else int(budget_bytes))
+        # References dropped by garbage collection, applied the next time the index is locked.
+        # Finalizers can run while this thread holds the lock, so they must not take it themselves.
+        self._released = deque()
+        self.publishes = 0
+        os.makedirs(self.directory, exist_ok=True)
+        atexit.register(self._release_all)
+
+    @contextmanager
+    def _locked(self):
+        """Hold the index lock and yield the index; it is written back on a clean exit."""
+        with open(os.path.join(self.directory, LOCK_FILENAME), "a+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                index = self._read_index()
+                while self._released:
+                    self._drop_ref(index, self._released.popleft())
+                yield index
+                self._write_index(index)
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _read_index(self):
+        try:
+            with open(os.path.join(self.directory, INDEX_FILENAME), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_index(self, index):
+        path = os.path.join(self.directory, INDEX_FILENAME)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        os.replace(tmp, path)
+
+    def _file(self, key):
+        return os.path.join(self.directory, key + ".bin")
+
+    @staticmethod
+    def store_key(file_key):
+        """Store name for a source LoRA file, from its (realpath, mtime, size) cache key."""
+        return hashlib.sha1(json.dumps(list(file_key)).encode("utf-8")).hexdigest()
+
+    def _acquire(self, index, key):
+        # Looked up each time so forked workers count as processes of their own
+        pid = str(os.getpid())
+        refs = index[key].setdefault("refs", {})
+        refs[pid] = refs.get(pid, 0) + 1
+        index[key]["last_used"] = time.time()
+
+    def _drop_ref(self, index, key):
+        entry = index.get(key)
+        if entry is None:
+            return
+        pid = str(os.getpid())
+        refs = entry.setdefault("refs", {})
+        n = refs.get(pid, 0) - 1
+        if n > 0:
+            refs[pid] = n
+        else:
+            refs.pop(pid, None)
+
+    def _release_all(self):
+        try:
+            with self._locked() as index:
+                for entry in index.values():
+                    entry.get("refs", {}).pop(str(os.getpid()), None)
+        except OSError:
+            pass
+
+    def _map(self, index, key):
+        """Map an indexed entry and take a reference released when the mapping is garbage collected."""
+        sd, mm = map_tensor_file(self._file(key))
+        self._acquire(index, key)
+        weakref.finalize(mm, self._released.append, key)
+        return sd
+
+    def _evict(self, index):
+        total = sum(e.get("nbytes", 0) for e in index.values())
+        if total <= self.budget_bytes:
+            return
+        for key, entry in sorted(index.items(), key=lambda kv: kv[1].get("last_used", 0)):
+            if total <= self.budget_bytes:
+                break
+            refs = entry.get("refs", {})
+            for pid in [p for p in refs if not _pid_alive(int(p))]:
+                del refs[pid]
+            if refs:
+                continue
+            try:
+                os.remove(self._file(key))
+            except OSError:
+                pass
+            total -= entry.get("nbytes", 0)
+            del index[key]
+            self.evictions += 1
+
+    def get(self, file_key, loader):
+        """State dict for the LoRA identified by file_key, mapped from the store.
+        On a miss loader(path) reads it and this process publishes it for the others."""
+        key = self.store_key(file_key)
+        with self._locked() as index:
+            entry = index.get(key)
+            if entry is not None and os.path.exists(self._file(key)):
+                self.hits += 1
+                return self._map(index, key)
+            if entry is not None:
+                # Backing file was removed behind our back (e.g. /dev/shm cleared)
+                del index[key]
+        self.misses += 1
+
+        sd = loader(file_key[0])
+        # Serialize outside the lock; a concurrent publisher of the same LoRA just wins the race
+        tmp = f"{self._file(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            nbytes = write_tensor_file(tmp, sd)
+        except Exception as e:
+            logger.warning(f"[DynamicLoraLoader] Could not publish {file_key[0]} to the shared store: {e}")
+            nbytes = None
+        if nbytes is None or nbytes > self.budget_bytes:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return sd
+
+        with self._locked() as index:
+            if key in index and os.path.exists(self._file(key)):
+                os.remove(tmp)
+            else:
+                os.replace(tmp, self._file(key))
+                index[key] = {"source": file_key[0], "nbytes": nbytes, "refs": {}, "last_used": time.time()}
+                self.publishes += 1
+            mapped = self._map(index, key)
+            self._evict(index)
+        return mapped
+
+    def stats(self):
+        try:
+            with self._locked() as index:
+                entries = len(index)
+                total = sum(e.get("nbytes", 0) for e in index.values())
+                mapped = sum(1 for e in index.values() if e.get("refs"))
+        except OSError:
+            entries = total = mapped = None
+        return self.counter_stats(directory=self.directory, entries=entries, bytes=total,
+                                  mapped_entries=mapped, budget_bytes=self.budget_bytes,
+                                  publishes=self.publishes)
+
+
+_SHARED_STORE = None
+_SHARED_STORE_LOCK = threading.Lock()
+
+
+def shared_store():
+    """The host-wide LoRA store, or None unless DYNAMIC_LORA_SHARED_STORE is set ("1" for the
+    default location under /dev/shm, or a directory). Needs fcntl, so it is unavailable on Windows."""
+    global _SHARED_STORE
+    setting = os.environ.get("DYNAMIC_LORA_SHARED_STORE", "")
+    if not setting or setting == "0" or fcntl is None:
+        return None
+    with _SHARED_STORE_LOCK:
+        if _SHARED_STORE is None:
+            try:
+                _SHARED_STORE = SharedLoraStore(None if setting == "1" else setting)
+            except OSError as e:
+                logger.warning(f"[DynamicLoraLoader] Shared LoRA store unavailable: {e}")
+                return None
+    return _SHARED_STORE
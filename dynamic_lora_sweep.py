@@ -0,0 +1,179 @@
+from .dynamic_lora_blocks import key_filter, scale_by_block
+from .dynamic_lora_cache import filtered_state_dict, lora_cache
+from .dynamic_lora_loader import DynamicLoraLoader
+from .dynamic_lora_metrics import logger, metrics
+from .dynamic_lora_plan import BLOCK_WEIGHT_ORDER, lora_tag, ordered_block_weights
+from .dynamic_lora_prefetch import prefetcher
+
+SWEEP_AXES = ["strength_multiplier", "strength"] + BLOCK_WEIGHT_ORDER
+
+
+def parse_sweep_values(text):
+    """Sweep values from "0.5, 1.0, 1.5" and/or inclusive "start:stop:step" ranges."""
+    values = []
+    for part in (text or "").replace(";", ",").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        try:
+            if ":" in part:
+                start, stop, step = (float(x) for x in part.split(":"))
+                if step == 0 or (stop - start) / step < 0:
+                    raise ValueError("step does not lead from start to stop")
+                n = int((stop - start) / step + 1e-9) + 1
+                values.extend(round(start + i * step, 10) for i in range(n))
+            else:
+                values.append(float(part))
+        except ValueError as e:
+            raise ValueError(f"[DynamicLoraStrengthSweep] Invalid sweep value {part!r}: {e}")
+    return values
+
+
+def _targets(text):
+    return {t.strip() for t in (text or "").split(",") if t.strip()}
+
+
+def _is_target(entry, targets):
+    # Merged plan entries carry the ids of all their configs joined by "+"
+    return not targets or entry.path in targets or any(i in targets for i in entry.id.split("+"))
+
+
+def _set_axis(setting, axis, value):
+    strength, block_weights = setting
+    if axis == "strength_multiplier":
+        return strength * value, block_weights
+    if axis == "strength":
+        return value, block_weights
+    return strength, ordered_block_weights(dict(block_weights, **{axis: value}))
+
+
+def _cell_prompt(pos_prompt, entries, settings):
+    """pos_prompt with the <lora:...> tag of every entry rewritten to a cell's (strength, block_weights)."""
+    tags = []
+    for i, (e, (strength, block_weights)) in enumerate(zip(entries, settings)):
+        tag = lora_tag(e)
+        if tag in pos_prompt:
+            # Placeholders first, so a rewritten tag is never mistaken for another entry's original
+            pos_prompt = pos_prompt.replace(tag, f"\0{i}\0", 1)
+            tags.append((f"\0{i}\0", lora_tag(e._replace(strength=strength, block_weights=block_weights))))
+    for placeholder, tag in tags:
+        pos_prompt = pos_prompt.replace(placeholder, tag, 1)
+    return pos_prompt
+
+
+class DynamicLoraStrengthSweep(DynamicLoraLoader):
+    """XY sweep over LoRA strengths or block weights for grids.
+    Resolves the LoRA plan once, reads and converts each LoRA file once, then builds one
+    MODEL/CLIP clone per grid cell that references the same patches at that cell's strengths.
+    Values are comma-separated and/or start:stop:step ranges; targets are config ids or LoRA
+    names (empty sweeps every applied LoRA). Cells are ordered row by row (x varies fastest)
+    and come with a label and prompts whose <lora:...> tags show the cell's settings.
+    The plan is not optimized, so configs at base strength 0 can still be swept."""
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        types = super().INPUT_TYPES()
+        optional = types["optional"]
+        del optional["encode_prompts"], optional["merge_cache"]
+        del optional["optimize_plan"], optional["strength_epsilon"]
+        types["required"]["x_axis"] = (SWEEP_AXES, {"default": "strength_multiplier"})
+        types["required"]["x_values"] = ("STRING", {"default": "0.5, 0.75, 1.0, 1.25, 1.5"})
+        optional["x_targets"] = ("STRING", {"default": ""})
+        optional["y_axis"] = (["none"] + SWEEP_AXES, {"default": "none"})
+        optional["y_values"] = ("STRING", {"default": ""})
+        optional["y_targets"] = ("STRING", {"default": ""})
+        return types
+
+    RETURN_TYPES = ("MODEL", "CLIP", "STRING", "STRING", "STRING", "STRING",)
+    RETURN_NAMES = ("model", "clip", "pos_prompt", "neg_prompt", "label", "trace",)
+    OUTPUT_IS_LIST = (True, True, True, True, True, False,)
+    FUNCTION = "build_sweep"
+    CATEGORY = "conditioning"
+
+    def _load_patches(self, model, clip, plan):
+        """[(entry, patches), ...] with every LoRA file of plan read and converted once."""
+        from .dynamic_lora_patcher import build_key_map, load_patches
+
+        with metrics().stage("file_io"):
+            files = self._plan_files(model, clip, plan, skip_zero=False)
+        # Block weights change from cell to cell, so only keys no cell patches are filtered out
+        keeps = [key_filter((), key[2], key[3], arch) for _, _, key, arch in files]
+        prefetcher().prefetch([(full, keep) for (_, full, _, _), keep in zip(files, keeps)])
+
+        key_map = build_key_map(model if any(key[2] for _, _, key, _ in files) else None,
+                                clip if any(key[3] for _, _, key, _ in files) else None)
+        loaded = []
+        for (e, full, key, _), keep in zip(files, keeps):
+            try:
+                with metrics().stage("file_io"):
+                    lora = filtered_state_dict(lora_cache().get(full), keep)
+                with metrics().stage("patching"):
+                    loaded.append((e, load_patches(lora, key_map), key[2], key[3]))
+            except Exception as ex:
+                logger.warning(f"[DynamicLoraStrengthSweep] Failed to load LoRA {e.id}: {ex}")
+                metrics().count("failed")
+        metrics().count("loaded", len(loaded))
+        return loaded
+
+    def _variant(self, model, clip, loaded, settings, blocks):
+        """MODEL/CLIP clones patched with loaded at per-entry (strength, block_weights) settings."""
+        from .dynamic_lora_patcher import add_passes
+
+        passes = []
+        for (_, patches, _, _), (strength, block_weights) in zip(loaded, settings):
+            if strength == 0:
+                continue
+            for bucket, s in scale_by_block(patches, strength, block_weights, blocks):
+                passes.append((s, bucket))
+        if not passes:
+            return model, clip
+        return add_passes(model, clip, passes,
+                          any(pm for (_, _, pm, _), (s, _) in zip(loaded, settings) if s != 0),
+                          any(pc for (_, _, _, pc), (s, _) in zip(loaded, settings) if s != 0))
+
+    def build_sweep(self, model, pos_prompt, neg_prompt, x_axis="strength_multiplier", x_values="", clip=None,
+                    seed=-1, whole_word_keywords=False, x_targets="", y_axis="none", y_values="",
+                    y_targets="", **kwargs):
+        xs = parse_sweep_values(x_values) or [None]
+        ys = parse_sweep_values(y_values) if y_axis != "none" else []
+        ys = ys or [None]
+        x_set, y_set = _targets(x_targets), _targets(y_targets)
+
+        with metrics().run("DynamicLoraStrengthSweep") as trace:
+            cfgs = self._collect_configs(kwargs)
+            trace.count("configs", len(cfgs))
+            plan = self.resolve_plan(pos_prompt, neg_prompt, cfgs,
+                                     self._collect_embeddings(kwargs, "pos_embedding_"),
+                                     self._collect_embeddings(kwargs, "neg_embedding_"),
+                                     seed, whole_word_keywords, optimize=False)
+            loaded = self._load_patches(model, clip, plan) if cfgs else []
+
+            blocks = {}
+            if model is not None and any(pm for _, _, pm, _ in loaded):
+                from .dynamic_lora_patcher import block_index
+                blocks = block_index(model)
+
+            models, clips, prompts, labels = [], [], [], []
+            with metrics().stage("patching"):
+                for y in ys:
+                    for x in xs:
+                        settings = []
+                        for e, _, _, _ in loaded:
+                            setting = (e.strength, e.block_weights)
+                            if x is not None and _is_target(e, x_set):
+                                setting = _set_axis(setting, x_axis, x)
+                            if y is not None and _is_target(e, y_set):
+                                setting = _set_axis(setting, y_axis, y)
+                            settings.append(setting)
+                        m, c = self._variant(model, clip, loaded, settings, blocks)
+                        models.append(m)
+                        clips.append(c)
+                        prompts.append(_cell_prompt(plan.pos_prompt, [e for e, _, _, _ in loaded], settings))
+                        label = [f"{x_axis}={x}"] if x is not None else []
+                        if y is not None:
+                            label.append(f"{y_axis}={y}")
+                        labels.append(", ".join(label))
+            trace.count("variants", len(models))
+            logger.info(f"[DynamicLoraStrengthSweep] {len(models)} variants from {len(loaded)} LoRA loads")
+        n = len(models)
+        return (models, clips, prompts, [plan.neg_prompt] * n, labels, trace.to_json())
@@ -0,0 +1,85 @@
+"""Resolve LoRA plans for many prompts offline, without ComfyUI.
+
+Reads a config library (the JSON/TOML format of the Dynamic Lora Config Library node) and prompts,
+one per line or as JSON lines ({"pos_prompt": ..., "neg_prompt": ..., "seed": ...}), and writes one
+JSON plan per line: the final prompts and the LoRAs (path, strength, block weights) the loader would apply.
+
+    python scripts/resolve_plans.py --configs library.json prompts.txt --output plans.jsonl
+    python scripts/resolve_plans.py --configs library.json prompts.jsonl --seed 1 --workers 8
+"""
+import argparse
+import importlib
+import json
+import os
+import sys
+import time
+import types
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE_NAME = "dynamic_lora_headless"
+
+# Register the package without running its __init__ (which loads the ComfyUI nodes), so only
+# the pure modules get imported. Done at import time so spawned worker processes see it too.
+if PACKAGE_NAME not in sys.modules:
+    _package = types.ModuleType(PACKAGE_NAME)
+    _package.__path__ = [REPO_DIR]
+    sys.modules[PACKAGE_NAME] = _package
+
+engine = importlib.import_module(f"{PACKAGE_NAME}.dynamic_lora_engine")
+library = importlib.import_module(f"{PACKAGE_NAME}.dynamic_lora_config_library")
+
+
+def read_jobs(f):
+    for line in f:
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("{"):
+            yield json.loads(line)
+        else:
+            yield line
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("prompts", help="prompt file (one prompt or JSON object per line), - for stdin")
+    parser.add_argument("--configs", action="append", required=True, help="config library file (repeatable)")
+    parser.add_argument("--neg", default="", help="negative prompt for jobs that don't set one")
+    parser.add_argument("--seed", type=int, default=-1, help="seed for jobs that don't set one")
+    parser.add_argument("--whole-word-keywords", action="store_true")
+    parser.add_argument("--no-optimize", action="store_true", help="skip the plan optimizer")
+    parser.add_argument("--strength-epsilon", type=float, default=engine.DEFAULT_STRENGTH_EPSILON)
+    parser.add_argument("--workers", type=int, default=0, help="worker processes (0 resolves in-process)")
+    parser.add_argument("--chunk-size", type=int, default=256)
+    parser.add_argument("--output", help="write plans here instead of stdout")
+    args = parser.parse_args(argv)
+
+    cfgs = []
+    for path in args.configs:
+        cfgs.extend(library.parse_library(library.read_library(path)))
+
+    src = sys.stdin if args.prompts == "-" else open(args.prompts, "r", encoding="utf-8")
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    start = time.perf_counter()
+    n = 0
+    try:
+        plans = engine.resolve_plans(read_jobs(src), cfgs, workers=args.workers, chunk_size=args.chunk_size,
+                                     seed=args.seed, neg_prompt=args.neg,
+                                     whole_word_keywords=args.whole_word_keywords,
+                                     optimize=not args.no_optimize, strength_epsilon=args.strength_epsilon)
+        for plan in plans:
+            out.write(json.dumps(plan) + "\n")
+            n += 1
+    finally:
+        if src is not sys.stdin:
+            src.close()
+        if out is not sys.stdout:
+            out.close()
+    elapsed = time.perf_counter() - start
+    print(f"{n} plans from {len(cfgs)} configs in {elapsed:.2f}s ({n / elapsed if elapsed else 0:.0f} prompts/s)",
+          file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
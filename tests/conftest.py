@@ -0,0 +1,34 @@
+"""Shared setup: the benchmark's ComfyUI stubs plus the package loaded from the repository."""
+import importlib.util
+import os
+import sys
+import tempfile
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_spec = importlib.util.spec_from_file_location("bench_loader", os.path.join(REPO_DIR, "benchmarks", "bench_loader.py"))
+bench = importlib.util.module_from_spec(_spec)
+sys.modules["bench_loader"] = bench
+_spec.loader.exec_module(bench)
+
+TMP_DIR = tempfile.mkdtemp(prefix="dynamic_lora_tests_")
+LORA_DIR = os.path.join(TMP_DIR, "loras")
+USER_DIR = os.path.join(TMP_DIR, "user")
+os.makedirs(LORA_DIR)
+os.makedirs(USER_DIR)
+os.environ.setdefault("DYNAMIC_LORA_MERGE_CACHE_DIR", os.path.join(TMP_DIR, "merge_cache"))
+bench.install_stubs(LORA_DIR, USER_DIR)
+bench.load_package()
+
+
+@pytest.fixture
+def mod():
+    """mod("dynamic_lora_engine") -> that module of the package under test."""
+    return lambda name: importlib.import_module(f"{bench.PACKAGE_NAME}.{name}")
+
+
+@pytest.fixture
+def lora_dir():
+    return LORA_DIR
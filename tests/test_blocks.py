@@ -0,0 +1,41 @@
+import re
+
+import pytest
+
+# (diffusers LoRA module, ldm model module) pairs of the same layer
+SDXL = [
+    ("lora_unet_down_blocks_0_resnets_1", "input_blocks.2.0"),
+    ("lora_unet_down_blocks_1_attentions_0_transformer_blocks_0_attn2_to_k", "input_blocks.4.1"),
+    ("lora_unet_down_blocks_2_attentions_1_proj_in", "input_blocks.8.1"),
+    ("lora_unet_mid_block_attentions_0_proj_out", "middle_block.1"),
+    ("lora_unet_up_blocks_0_attentions_2_proj_in", "output_blocks.2.1"),
+    ("lora_unet_up_blocks_1_attentions_0_transformer_blocks_0_attn1_to_q", "output_blocks.3.1"),
+    ("lora_unet_up_blocks_1_upsamplers_0_conv", "output_blocks.5.2"),
+    ("lora_unet_up_blocks_2_resnets_2_conv1", "output_blocks.8.0"),
+]
+SD1 = [
+    ("lora_unet_down_blocks_0_attentions_1_proj_in", "input_blocks.2.1"),
+    ("lora_unet_down_blocks_2_downsamplers_0_conv", "input_blocks.9.0"),
+    ("lora_unet_down_blocks_3_resnets_1_conv1", "input_blocks.11.0"),
+    ("lora_unet_up_blocks_0_resnets_1_conv1", "output_blocks.1.0"),
+    ("lora_unet_up_blocks_1_attentions_0_proj_in", "output_blocks.3.1"),
+    ("lora_unet_up_blocks_2_upsamplers_0_conv", "output_blocks.8.2"),
+    ("lora_unet_up_blocks_3_attentions_2_proj_out", "output_blocks.11.1"),
+]
+
+
+@pytest.mark.parametrize("arch, pairs", [("sdxl", SDXL), ("sd1", SD1), ("sd2", SD1)])
+def test_diffusers_keys_land_in_the_block_of_their_model_weight(mod, arch, pairs):
+    block_of_key = mod("dynamic_lora_blocks").block_of_key
+    for lora_module, model_module in pairs:
+        model_block = block_of_key(f"diffusion_model.{model_module}.weight", arch)
+        assert model_block is not None
+        assert block_of_key(f"{lora_module}.lora_down.weight", arch) == model_block, lora_module
+        dotted = re.sub(r"_(\d+)_?", r".\1.", lora_module[len("lora_unet_"):])
+        assert block_of_key(f"unet.{dotted}lora_A.weight", arch) == model_block
+
+
+def test_key_filter_drops_zero_weight_blocks_of_sdxl_diffusers_loras(mod):
+    keep = mod("dynamic_lora_blocks").key_filter((("OUT03_composition", 0.0),), arch="sdxl")
+    assert not keep("lora_unet_up_blocks_1_attentions_0_proj_in.lora_down.weight")
+    assert keep("lora_unet_up_blocks_0_attentions_0_proj_in.lora_down.weight")
@@ -0,0 +1,73 @@
+import sys
+import types
+
+import pytest
+
+from conftest import bench
+
+MB = 1024 ** 2
+
+
+class FakeSafeOpen:
+    """safetensors.safe_open over a file of ten 1 MB tensors."""
+
+    def __init__(self, path, framework, device):
+        self.path = path
+
+    def keys(self):
+        return [f"lora_unet_{i}.lora_up.weight" for i in range(10)]
+
+    def get_tensor(self, key):
+        return bench.FakeTensor((MB // 2,))
+
+
+@pytest.fixture
+def cache_mod(mod, monkeypatch):
+    monkeypatch.setitem(sys.modules, "safetensors", types.SimpleNamespace(safe_open=FakeSafeOpen))
+    return mod("dynamic_lora_cache")
+
+
+@pytest.fixture
+def loras(tmp_path):
+    paths = []
+    for i in range(10):
+        path = tmp_path / f"lora_{i}.safetensors"
+        path.write_bytes(b"")
+        paths.append(str(path))
+    return paths
+
+
+def read_all(sd):
+    for key in sd:
+        sd[key]
+
+
+def test_lazy_state_dicts_are_held_to_the_budget(cache_mod, loras):
+    cache = cache_mod.LoraStateDictCache(budget_bytes=5 * MB)
+    for path in loras:
+        read_all(cache.get(path, loader=cache_mod.LazyLoraStateDict))
+        assert cache.stats()["bytes"] <= 5 * MB
+    stats = cache.stats()
+    assert stats["evictions"] == 10
+    assert stats["entries"] == 0
+
+
+def test_lazy_state_dict_growth_evicts_least_recently_used(cache_mod, loras):
+    cache = cache_mod.LoraStateDictCache(budget_bytes=25 * MB)
+    sds = [cache.get(path, loader=cache_mod.LazyLoraStateDict) for path in loras[:3]]
+    assert cache.stats()["bytes"] == 0
+    for sd in sds:
+        read_all(sd)
+    assert cache.stats()["bytes"] == 20 * MB
+    assert not cache.contains(loras[0])
+    assert cache.contains(loras[1]) and cache.contains(loras[2])
+    # Reads after eviction are no longer charged to the cache
+    sds[0][next(iter(sds[0]))]
+    assert cache.stats()["bytes"] == 20 * MB
+
+
+def test_budget_from_environment(cache_mod, monkeypatch):
+    monkeypatch.setenv("DYNAMIC_LORA_CACHE_BYTES", str(3 * MB))
+    assert cache_mod.LoraStateDictCache().budget_bytes == 3 * MB
+    monkeypatch.setenv("DYNAMIC_LORA_CACHE_BYTES", "lots")
+    assert cache_mod.LoraStateDictCache().budget_bytes == cache_mod.DEFAULT_BUDGET_BYTES
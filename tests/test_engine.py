@@ -0,0 +1,136 @@
+import random
+
+import pytest
+
+
+@pytest.fixture
+def engine(mod):
+    return mod("dynamic_lora_engine")
+
+
+@pytest.fixture
+def LoraConfig(mod):
+    return mod("dynamic_lora_config_record").LoraConfig
+
+
+def kw(*words, multiplier=1.0):
+    return [{"keywords": list(words), "multiplier": multiplier}]
+
+
+def test_matcher_reports_every_matching_group(mod, LoraConfig):
+    cfgs = [LoraConfig("a", "a.safetensors", keywords_groups=kw("red hat") + kw("blue", multiplier=2.0)),
+            LoraConfig("b", "b.safetensors", keywords_groups=kw("hat"))]
+    matcher = mod("dynamic_lora_matcher").KeywordMatcher(cfgs)
+    assert matcher.match("A Red Hat and BLUE shoes") == {0: {0, 1}, 1: {0}}
+    assert matcher.match("nothing here") == {}
+
+
+def test_matcher_whole_word(mod, LoraConfig):
+    cfgs = [LoraConfig("a", "a.safetensors", keywords_groups=kw("cat"))]
+    matcher = mod("dynamic_lora_matcher").KeywordMatcher(cfgs, whole_word=True)
+    assert matcher.match("a cat, sitting") == {0: {0}}
+    assert matcher.match("concatenate") == {}
+
+
+def test_randomizer_nested_weighted_and_seeded(mod):
+    template = mod("dynamic_lora_randomizer").compile_template("a {red:{light:dark} blue} hat")
+    assert template.has_choices
+    assert sorted(template.enumerate_all()) == ["a dark blue hat", "a light blue hat", "a red hat"]
+    assert template.expand(5, seed=7) == template.expand(5, seed=7)
+    weighted = mod("dynamic_lora_randomizer").compile_template("{99*x:y}")
+    assert weighted.expand(200, seed=1).count("x") > 150
+
+
+def test_resolve_plan_strengths_offsets_and_tags(engine, LoraConfig):
+    cfgs = [
+        LoraConfig("a", "a.safetensors", base_strength=1.0, keywords_groups=kw("cat", multiplier=1.5),
+                   offsets={"b": 0.5}, activation_tags=["style"]),
+        LoraConfig("b", "b.safetensors", base_strength=0.8),
+        LoraConfig("c", "c.safetensors", keywords_groups=kw("dog")),
+        LoraConfig("d", "d.safetensors", base_strength=5.0, max_strength=2.0),
+    ]
+    plan = engine.resolve_plan("a cat", "ugly", cfgs, seed=1)
+    strengths = {e.id: e.strength for e in plan.entries}
+    # 1.0 + (1.5 - 1.0) = 1.5, times the 0.5 offset from b; d is clamped to max_strength
+    assert strengths == {"a": 0.75, "b": 0.8, "d": 2.0}
+    assert plan.pos_prompt.endswith("style a cat")
+    assert "<lora:a.safetensors:0.75>" in plan.pos_prompt
+    assert plan.neg_prompt == "ugly"
+
+
+def test_resolve_plan_is_memoized_only_when_deterministic(engine, LoraConfig):
+    cfgs = [LoraConfig("a", "a.safetensors")]
+    assert engine.resolve_plan("x {a:b}", "", cfgs, seed=3) is engine.resolve_plan("x {a:b}", "", cfgs, seed=3)
+    random.seed(0)
+    prompts = {engine.resolve_plan("{a:b:c:d:e:f}", "", cfgs).pos_prompt for _ in range(40)}
+    assert len(prompts) > 1
+
+
+def test_combo_all_or_none_pulls_in_members(engine, LoraConfig):
+    cfgs = [LoraConfig("a", "a.safetensors", keywords_groups=kw("cat")),
+            LoraConfig("b", "b.safetensors", base_strength=0.7, keywords_groups=kw("dog"), offsets={"a": 2.0})]
+    cfgs = [c.with_combo("g", "all_or_none", i) for i, c in enumerate(cfgs)]
+    strengths = {}
+    active = engine.resolve_config_combinations(cfgs, [cfgs[1]], strengths)
+    assert [c.id for c in active] == ["b", "a"]
+    # Pulled-in members use their base strength
+    assert strengths[id(cfgs[0])] == 1.0
+
+
+def test_combo_primary_triggers_all(engine, LoraConfig):
+    cfgs = [LoraConfig(i, f"{i}.safetensors", keywords_groups=kw(i)).with_combo("g", "primary_triggers_all", n)
+            for n, i in enumerate(["p", "q", "r"])]
+    assert [c.id for c in engine.resolve_config_combinations(cfgs, [cfgs[1]], {})] == ["q"]
+    assert [c.id for c in engine.resolve_config_combinations(cfgs, [cfgs[0]], {})] == ["p", "q", "r"]
+
+
+def test_combo_activation_propagates_across_groups(engine, LoraConfig):
+    a, b, c = (LoraConfig(i, f"{i}.safetensors", keywords_groups=kw(i)) for i in "abc")
+    a, b = a.with_combo("g1", "all_or_none", 0), b.with_combo("g1", "all_or_none", 1)
+    b, c = b.with_combo("g2", "all_or_none", 0), c.with_combo("g2", "all_or_none", 1)
+    assert [x.id for x in engine.resolve_config_combinations([a, b, c], [a], {})] == ["a", "b", "c"]
+
+
+def test_optimize_plan_merges_prunes_and_orders(mod):
+    plan = mod("dynamic_lora_plan")
+    E = plan.PlanEntry
+    entries = (
+        E("b", "b.st", 0.5, (), None),
+        E("a1", "a.st", 0.6, (("IN00_fine_texture", 0.0),), None),
+        E("a2", "a.st", 0.4, (), None),
+        E("z", "z.st", 1e-6, (), None),
+        E("c1", "c.st", 1.0, (), None),
+        E("c2", "c.st", -1.0, (), None),
+    )
+    out, report = plan.optimize_plan(entries)
+    assert [(e.id, e.path, e.strength) for e in out] == [("a1+a2", "a.st", 1.0), ("b", "b.st", 0.5)]
+    # 0.6 * 0.0 + 0.4 * 1.0 over the combined strength of 1.0
+    assert out[0].block_weights == (("IN00_fine_texture", 0.4),)
+    assert report.merged == (("a.st", ("a1", "a2")), ("c.st", ("c1", "c2")))
+    assert [i for i, _ in report.pruned] == ["z", "c1+c2"]
+    assert (report.applications_in, report.applications_out) == (6, 2)
+
+
+def test_optimize_plan_keeps_entries_it_cannot_fold(mod):
+    plan = mod("dynamic_lora_plan")
+    E = plan.PlanEntry
+    entries = (E("d1", "d.st", 1.0, (("MID_global_structure", 2.0),), None), E("d2", "d.st", -1.0, (), None))
+    out, report = plan.optimize_plan(entries)
+    assert [e.id for e in out] == ["d1", "d2"]
+    assert report.merged == ()
+
+
+def test_plan_round_trips_through_json(engine, LoraConfig):
+    import json
+    cfgs = [LoraConfig("a", "a.safetensors", block_weights={"MID_global_structure": 0.5}),
+            LoraConfig("b", "a.safetensors")]
+    plan = engine.resolve_plan("x", "", cfgs, seed=1)
+    assert engine.plan_from_dict(json.loads(json.dumps(engine.plan_to_dict(plan)))) == plan
+
+
+def test_resolve_plans_matches_resolve_plan(engine, LoraConfig):
+    cfgs = [LoraConfig("a", "a.safetensors", keywords_groups=kw("cat")), LoraConfig("b", "b.safetensors")]
+    jobs = ["a cat", {"pos_prompt": "a dog", "neg_prompt": "bad", "seed": 2}]
+    plans = list(engine.resolve_plans(jobs, cfgs, seed=1))
+    assert plans[0] == engine.plan_to_dict(engine.resolve_plan("a cat", "", cfgs, seed=1))
+    assert plans[1] == engine.plan_to_dict(engine.resolve_plan("a dog", "bad", cfgs, seed=2))
@@ -0,0 +1,104 @@
+import json
+import struct
+
+import pytest
+
+from conftest import bench
+
+
+@pytest.fixture
+def hi(mod):
+    return mod("dynamic_lora_header_index")
+
+
+def header(*keys, width=64, rank=4):
+    return {k: {"dtype": "F16", "shape": [rank, width] if "down" in k or "lora_A" in k else [width, rank]}
+            for k in keys}
+
+
+def test_targets_of_recognised_keys(hi):
+    unet = hi.summarize_header(header("lora_unet_mid_block_attentions_0_proj_in.lora_down.weight"), {})
+    te = hi.summarize_header(header("lora_te1_text_model_encoder_layers_0_mlp_fc1.lora_down.weight"), {})
+    assert hi.lora_targets(unet) == (True, False)
+    assert hi.lora_targets(te) == (False, True)
+    transformer = hi.summarize_header(header("lora_transformer_single_blocks_0_linear1.lora_down.weight"), {})
+    prior = hi.summarize_header(header("lora_prior_unet_down_blocks_0_attentions_0.lora_down.weight"), {})
+    assert hi.lora_targets(transformer) == hi.lora_targets(prior) == (True, False)
+
+
+def test_unrecognised_keys_patch_both(hi):
+    info = hi.summarize_header(header("base_model.model.down_blocks.0.attentions.0.to_q.lora_A.weight"), {})
+    assert not info["has_unet"] and not info["has_te"]
+    assert hi.lora_targets(info) == (True, True)
+    assert hi.lora_targets(None) == (True, True)
+
+
+@pytest.mark.parametrize("width, arch", [(768, "sd1"), (1024, "sd2"), (2048, "sdxl")])
+def test_arch_from_cross_attention_width(hi, width, arch):
+    key = "lora_unet_down_blocks_1_attentions_0_transformer_blocks_0_attn2_to_k.lora_down.weight"
+    info = hi.summarize_header(header(key, width=width), {})
+    assert info["arch"] == arch
+
+
+def test_arch_metadata_wins(hi):
+    key = "lora_unet_down_blocks_1_attentions_0_transformer_blocks_0_attn2_to_k.lora_down.weight"
+    assert hi.summarize_header(header(key, width=768), {"ss_base_model_version": "sdxl_base_v1-0"})["arch"] == "sdxl"
+
+
+def test_loader_patches_both_sides_of_unrecognised_files(mod, lora_dir):
+    keys = header("base_model.model.blocks.0.attn.to_q.lora_A.weight",
+                  "base_model.model.blocks.0.attn.to_q.lora_B.weight")
+    offset = 0
+    for v in keys.values():
+        size = v["shape"][0] * v["shape"][1] * 2
+        v["data_offsets"] = [offset, offset + size]
+        offset += size
+    raw = json.dumps(keys).encode()
+    with open(f"{lora_dir}/unrecognised.safetensors", "wb") as f:
+        f.write(struct.pack("<Q", len(raw)) + raw + b"\0" * offset)
+
+    plan_mod = mod("dynamic_lora_plan")
+    plan = plan_mod.LoraPlan((plan_mod.PlanEntry("u", "unrecognised.safetensors", 1.0, (), None),), "p", "n")
+    model, clip = bench.make_model_and_clip()
+    files = mod("dynamic_lora_loader").DynamicLoraLoader()._plan_files(model, clip, plan)
+    assert [(key[2], key[3]) for _, _, key, _ in files] == [(True, True)]
+
+
+def test_truncated_index_is_rebuilt(hi, tmp_path):
+    path = str(tmp_path / "index.json.gz")
+    index = hi.LoraHeaderIndex(path)
+    index._entries["x"] = {"mtime_ns": 0, "size": 0}
+    index._dirty = True
+    index.save()
+    with open(path, "rb") as f:
+        data = f.read()
+    with open(path, "wb") as f:
+        f.write(data[:len(data) // 2])
+    assert hi.LoraHeaderIndex(path)._entries == {}
+    assert [p.name for p in tmp_path.iterdir()] == ["index.json.gz"]
+
+
+def test_loader_filters_blocks_with_the_model_layout(mod, lora_dir):
+    class SD15:
+        pass
+
+    key = "lora_unet_up_blocks_1_attentions_0_proj_in.lora_down.weight"
+    keys = header(key, key.replace("down", "up"))
+    offset = 0
+    for v in keys.values():
+        size = v["shape"][0] * v["shape"][1] * 2
+        v["data_offsets"] = [offset, offset + size]
+        offset += size
+    raw = json.dumps(keys).encode()
+    with open(f"{lora_dir}/archless.safetensors", "wb") as f:
+        f.write(struct.pack("<Q", len(raw)) + raw + b"\0" * offset)
+
+    plan_mod = mod("dynamic_lora_plan")
+    entry = plan_mod.PlanEntry("a", "archless.safetensors", 1.0, (("OUT03_composition", 0.0),), None)
+    model, clip = bench.make_model_and_clip()
+    model.model.model_config = SD15()
+    [(_, _, file_key, arch)] = mod("dynamic_lora_loader").DynamicLoraLoader()._plan_files(
+        model, clip, plan_mod.LoraPlan((entry,), "p", "n"))
+    assert arch == "sd1"
+    # On SD1 this layer is OUT00, which the user left at full weight
+    assert mod("dynamic_lora_blocks").key_filter(entry.block_weights, file_key[2], file_key[3], arch)(key)
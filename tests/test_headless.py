@@ -0,0 +1,20 @@
+import subprocess
+import sys
+
+from conftest import REPO_DIR
+
+HEADLESS_IMPORT = f"""
+import importlib, sys, types
+package = types.ModuleType("dynamic_lora_headless")
+package.__path__ = [{REPO_DIR!r}]
+sys.modules["dynamic_lora_headless"] = package
+for name in ("dynamic_lora_loader", "dynamic_lora_batch_loader", "dynamic_lora_sweep", "dynamic_lora_engine",
+             "dynamic_lora_config_library"):
+    importlib.import_module("dynamic_lora_headless." + name)
+assert "folder_paths" not in sys.modules and "comfy" not in sys.modules
+"""
+
+
+def test_node_modules_import_without_comfyui():
+    result = subprocess.run([sys.executable, "-c", HEADLESS_IMPORT], capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
@@ -0,0 +1,107 @@
+import os
+import random
+import sys
+import time
+
+import pytest
+
+from conftest import bench
+
+
+@pytest.fixture
+def mc(mod):
+    return mod("dynamic_lora_merge_cache")
+
+
+def write_entry(directory, name, size, age):
+    path = os.path.join(directory, name)
+    with open(path, "wb") as f:
+        f.write(b"\0" * size)
+    mtime = time.time() - age
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_evicts_least_recently_used_by_mtime(mc, tmp_path):
+    cache = mc.MergeCache(str(tmp_path), budget_bytes=250)
+    oldest = write_entry(str(tmp_path), "a.safetensors", 100, 30)
+    middle = write_entry(str(tmp_path), "b.safetensors", 100, 20)
+    newest = write_entry(str(tmp_path), "c.safetensors", 100, 10)
+    cache._evict()
+    assert not os.path.exists(oldest)
+    assert os.path.exists(middle) and os.path.exists(newest)
+    assert cache.stats()["evictions"] == 1
+
+
+def test_evict_removes_stale_temp_files_only(mc, tmp_path):
+    cache = mc.MergeCache(str(tmp_path))
+    stale = write_entry(str(tmp_path), "a.safetensors.1.2.tmp", 10, mc.STALE_TMP_SECONDS + 60)
+    in_flight = write_entry(str(tmp_path), "b.safetensors.1.3.tmp", 10, 1)
+    cache._evict()
+    assert not os.path.exists(stale)
+    assert os.path.exists(in_flight)
+
+
+def test_miss_accounting(mc, tmp_path):
+    cache = mc.MergeCache(str(tmp_path))
+    assert cache.load("0" * 64, source_bytes=100) is None
+    assert cache.stats()["misses"] == 1 and cache.stats()["hit_rate"] == 0.0
+
+
+def test_store_skips_non_lora_patches(mc, tmp_path):
+    cache = mc.MergeCache(str(tmp_path))
+    assert cache.store("k", [(1.0, {"w": ("diff", (None,))})]) is False
+    assert os.listdir(tmp_path) == []
+
+
+def test_store_load_round_trip(mc, tmp_path):
+    torch = pytest.importorskip("torch")
+    pytest.importorskip("safetensors")
+    cache = mc.MergeCache(str(tmp_path))
+    up, down = torch.randn(8, 2), torch.randn(2, 8)
+    passes = [(0.5, {"a.weight": ("lora", (up, down, 2.0, None, None)),
+                     ("qkv.weight", (0, 8, 8)): ("lora", (up, down, None, None, None))})]
+    assert cache.store("k", passes)
+    assert [n for n in os.listdir(tmp_path) if n.endswith(".tmp")] == []
+    size = os.path.getsize(cache._path("k"))
+
+    [(strength, patches)] = cache.load("k", source_bytes=size + 1000)
+    assert strength == 0.5
+    assert set(patches) == {"a.weight", ("qkv.weight", (0, 8, 8))}
+    up2, down2, alpha = mc._low_rank(patches["a.weight"])
+    assert torch.equal(up2, up) and torch.equal(down2, down) and alpha == 2.0
+    assert mc._low_rank(patches[("qkv.weight", (0, 8, 8))])[2] is None
+
+    assert cache.load("missing") is None
+    stats = cache.stats()
+    assert (stats["stores"], stats["hits"], stats["misses"]) == (1, 1, 1)
+    assert stats["hit_rate"] == 0.5
+    assert stats["bytes_saved"] == 1000
+
+
+def test_loader_reads_repeated_plans_from_the_merge_cache(mod, mc, lora_dir, tmp_path, monkeypatch):
+    torch = pytest.importorskip("torch")
+    pytest.importorskip("safetensors")
+
+    def load_lora(lora, key_map):
+        patches = {}
+        for lora_key, model_key in key_map.items():
+            up = lora.get(f"{lora_key}.lora_up.weight")
+            if up is not None:
+                patches[model_key] = ("lora", (up, lora[f"{lora_key}.lora_down.weight"], None, None, None))
+        return patches
+    monkeypatch.setattr(sys.modules["comfy.lora"], "load_lora", load_lora)
+    monkeypatch.setattr(mc, "_MERGE_CACHE", mc.MergeCache(str(tmp_path)))
+
+    bench.write_lora(f"{lora_dir}/merged.safetensors", random.Random(2), 4, 0)
+    plan_mod = mod("dynamic_lora_plan")
+    plan = plan_mod.LoraPlan((plan_mod.PlanEntry("m", "merged.safetensors", 0.8, (), None),), "p", "n")
+    model, clip = bench.make_model_and_clip()
+    first, _ = mod("dynamic_lora_loader").DynamicLoraLoader().apply_plan(model, clip, plan, merge_cache=True)
+    assert mc.merge_cache().stats()["stores"] == 1
+
+    # A fresh node has no patch state to reuse, so the second run can only come from the merge cache
+    second, _ = mod("dynamic_lora_loader").DynamicLoraLoader().apply_plan(model, clip, plan, merge_cache=True)
+    assert mc.merge_cache().stats()["hits"] == 1
+    assert set(second.patches) == set(first.patches)
+    assert all(s == 0.8 for k in second.patches for s, *_ in second.patches[k])
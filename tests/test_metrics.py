@@ -0,0 +1,12 @@
+import pytest
+
+
+def test_stage_names_are_validated(mod):
+    metrics = mod("dynamic_lora_metrics").LoaderMetrics()
+    with metrics.run("test") as trace:
+        with metrics.stage("matching"):
+            pass
+        with pytest.raises(ValueError):
+            with metrics.stage("matchign"):
+                pass
+    assert list(trace.stages) == ["matching"]
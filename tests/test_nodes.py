@@ -0,0 +1,40 @@
+import math
+
+import pytest
+
+
+@pytest.mark.parametrize("node, prompts", [
+    ("dynamic_lora_loader.DynamicLoraLoader", ("pos_prompt", "neg_prompt")),
+    ("dynamic_lora_batch_loader.DynamicLoraBatchLoader", ("pos_prompts", "neg_prompts")),
+    ("dynamic_lora_sweep.DynamicLoraStrengthSweep", ("pos_prompt", "neg_prompt")),
+])
+def test_is_changed_accepts_linked_inputs(mod, node, prompts):
+    module, name = node.split(".")
+    cls = getattr(mod(module), name)
+    pos, neg = prompts
+    # Linked inputs are passed as None
+    linked = dict(seed=None, whole_word_keywords=None, optimize_plan=None, strength_epsilon=None)
+    key = cls.IS_CHANGED(**{pos: "a {red:blue} hat", neg: None}, **linked)
+    assert key == cls.IS_CHANGED(**{pos: "a {red:blue} hat", neg: None}, **linked)
+    assert cls.IS_CHANGED(**{pos: None, neg: None}, **linked) != key
+    assert math.isnan(cls.IS_CHANGED(**{pos: "a {red:blue} hat", neg: ""}, seed=-1))
+    assert cls.IS_CHANGED(**{pos: "a {red:blue} hat", neg: ""}, seed=3) == cls.IS_CHANGED(
+        **{pos: "a {red:blue} hat", neg: ""}, seed=3)
+
+
+def test_batch_loader_outputs_one_entry_per_prompt(mod, lora_dir):
+    import random
+    from conftest import bench
+
+    bench.write_lora(f"{lora_dir}/batch_cat.safetensors", random.Random(0), 4, 2)
+    LoraConfig = mod("dynamic_lora_config_record").LoraConfig
+    cat = LoraConfig("cat", "batch_cat.safetensors", keywords_groups=[{"keywords": ["cat"], "multiplier": 1.0}])
+    node = mod("dynamic_lora_batch_loader").DynamicLoraBatchLoader()
+    model, clip = bench.make_model_and_clip()
+    models, clips, pos, neg, _ = node.build_batches(model, "a cat\na dog\nthe cat", "ugly", clip=clip, seed=1,
+                                                    config_1=cat)
+    # Ordered by plan group: both cat prompts share one patched MODEL/CLIP
+    assert pos == ["<lora:batch_cat.safetensors:1.0> a cat", "<lora:batch_cat.safetensors:1.0> the cat", "a dog"]
+    assert neg == ["ugly"] * 3
+    assert models[0] is models[1] and clips[0] is clips[1]
+    assert models[0] is not model and models[2] is model and clips[2] is clip
@@ -0,0 +1,47 @@
+import sys
+
+import pytest
+
+from conftest import bench
+
+QKV = "diffusion_model.input_blocks.1.1.transformer_blocks.0.attn1.in_proj.weight"
+
+
+@pytest.fixture
+def fused_qkv_lora(monkeypatch):
+    """load_lora stand-in that hands back the LoRA dict itself, so tests control the patch keys."""
+    monkeypatch.setattr(sys.modules["comfy.lora"], "load_lora", lambda lora, key_map: dict(lora))
+    return {(QKV, (0, 0, 64)): ("diff", ("q",)), (QKV, (0, 64, 64)): ("diff", ("k",)),
+            "diffusion_model.out.weight": ("diff", ("o",))}
+
+
+def application(mod, lora, strength):
+    return mod("dynamic_lora_patcher").LoraApplication(
+        key=("a.safetensors", "a"), lora=lora, strength=strength, block_weights=(),
+        patch_model=True, patch_clip=False)
+
+
+def test_rescale_replaces_offset_keyed_patches(mod, fused_qkv_lora):
+    model, clip = bench.make_model_and_clip()
+    state = mod("dynamic_lora_patcher").PatchState(model, clip)
+    first, _ = state.update([application(mod, fused_qkv_lora, 1.0)])
+    assert sorted((s, off) for s, _, _, off, _ in first.patches[QKV]) == [(1.0, (0, 0, 64)), (1.0, (0, 64, 64))]
+
+    second, _ = state.update([application(mod, fused_qkv_lora, 0.5)])
+    assert sorted((s, off) for s, _, _, off, _ in second.patches[QKV]) == [(0.5, (0, 0, 64)), (0.5, (0, 64, 64))]
+    assert [s for s, *_ in second.patches["diffusion_model.out.weight"]] == [0.5]
+    # The clone handed out earlier keeps its own patches
+    assert [s for s, *_ in first.patches[QKV]] == [1.0, 1.0]
+    assert model.patches == {}
+
+
+def test_removal_drops_offset_keyed_patches(mod, fused_qkv_lora):
+    model, clip = bench.make_model_and_clip()
+    state = mod("dynamic_lora_patcher").PatchState(model, clip)
+    other = {(QKV, (0, 128, 64)): ("diff", ("v",))}
+    a = application(mod, fused_qkv_lora, 1.0)
+    b = application(mod, other, 1.0)._replace(key=("b.safetensors", "b"))
+    state.update([a, b])
+    patched, _ = state.update([b])
+    assert [off for _, _, _, off, _ in patched.patches[QKV]] == [(0, 128, 64)]
+    assert "diffusion_model.out.weight" not in patched.patches
@@ -0,0 +1,67 @@
+import gc
+import os
+
+import pytest
+
+
+@pytest.fixture
+def shm(mod):
+    return mod("dynamic_lora_shm")
+
+
+def test_eviction_skips_entries_mapped_by_live_processes(shm, tmp_path):
+    store = shm.SharedLoraStore(str(tmp_path), budget_bytes=200)
+    with store._locked() as index:
+        for i, (key, refs) in enumerate((("held", {str(os.getpid()): 1}), ("dead", {"999999999": 1}),
+                                         ("free", {}))):
+            open(store._file(key), "wb").close()
+            index[key] = {"nbytes": 100, "refs": refs, "last_used": i}
+        store._evict(index)
+    assert sorted(index) == ["free", "held"]
+    assert not os.path.exists(store._file("dead"))
+    assert store.stats()["evictions"] == 1
+
+
+def test_tensor_file_round_trip(shm, tmp_path):
+    torch = pytest.importorskip("torch")
+    sd = {"up": torch.randn(7, 3), "down": torch.randn(3, 5).to(torch.bfloat16),
+          "alpha": torch.tensor(4.0), "empty": torch.empty(0, 2)}
+    path = str(tmp_path / "t.bin")
+    assert shm.write_tensor_file(path, sd) == os.path.getsize(path)
+    mapped, _ = shm.map_tensor_file(path)
+    assert set(mapped) == set(sd)
+    for name, t in sd.items():
+        assert mapped[name].dtype == t.dtype and mapped[name].shape == t.shape
+        assert torch.equal(mapped[name], t)
+    assert mapped["alpha"].dim() == 0
+    assert shm.write_tensor_file(path, {"x": "not a tensor"}) is None
+
+
+def test_store_publish_hit_and_refcounted_eviction(shm, tmp_path):
+    torch = pytest.importorskip("torch")
+    store = shm.SharedLoraStore(str(tmp_path / "store"), budget_bytes=6000)
+    loads = []
+
+    def loader(path):
+        loads.append(path)
+        return {"w": torch.ones(1024)}  # 4 KB
+
+    first = store.get(("a", 1, 1), loader)
+    again = store.get(("a", 1, 1), loader)
+    assert loads == ["a"]
+    assert torch.equal(again["w"], first["w"])
+    assert (store.publishes, store.hits, store.misses) == (1, 1, 1)
+
+    # Over budget, but "a" is still mapped here, so nothing can go
+    second = store.get(("b", 1, 1), loader)
+    assert store.stats()["entries"] == 2 and store.evictions == 0
+
+    del first, again
+    gc.collect()
+    third = store.get(("c", 1, 1), loader)
+    assert store.evictions == 1
+    with store._locked() as index:
+        assert store.store_key(("a", 1, 1)) not in index
+        assert store.store_key(("b", 1, 1)) in index
+    assert not os.path.exists(store._file(store.store_key(("a", 1, 1))))
+    del second, third
@@ -0,0 +1,29 @@
+import random
+
+from conftest import bench
+
+
+def test_sweep_cells_carry_their_own_tags_and_sweep_from_zero(mod, lora_dir):
+    bench.write_lora(f"{lora_dir}/sweep.safetensors", random.Random(1), 4, 2)
+    LoraConfig = mod("dynamic_lora_config_record").LoraConfig
+    cfg = LoraConfig("s", "sweep.safetensors", base_strength=0.0)
+    node = mod("dynamic_lora_sweep").DynamicLoraStrengthSweep()
+    model, clip = bench.make_model_and_clip()
+    models, clips, pos, neg, labels, _ = node.build_sweep(
+        model, "a cat", "ugly", x_axis="strength", x_values="0, 0.5", clip=clip, seed=1,
+        y_axis="MID_global_structure", y_values="0.25", config_1=cfg)
+    assert labels == ["strength=0.0, MID_global_structure=0.25", "strength=0.5, MID_global_structure=0.25"]
+    assert pos == ["<lora:sweep.safetensors:0.0:0.25> a cat", "<lora:sweep.safetensors:0.5:0.25> a cat"]
+    assert neg == ["ugly", "ugly"]
+    # Strength 0 is skipped per cell; the base-strength-0 config is still swept
+    assert models[0] is model and clips[0] is clip
+    assert models[1] is not model and models[1].patches
+
+
+def test_cell_prompt_rewrites_each_tag_once(mod):
+    sweep, plan = mod("dynamic_lora_sweep"), mod("dynamic_lora_plan")
+    a = plan.PlanEntry("a", "a.st", 1.0, (), None)
+    b = plan.PlanEntry("b", "b.st", 0.5, (), None)
+    # Swapping strengths must not rewrite a freshly written tag again
+    prompt = sweep._cell_prompt("<lora:b.st:0.5> <lora:a.st:1.0> x", [a, b], [(0.5, ()), (1.0, ())])
+    assert prompt == "<lora:b.st:1.0> <lora:a.st:0.5> x"